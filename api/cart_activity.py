@@ -0,0 +1,85 @@
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Sum, Value, When
+
+from . import topk
+from .models import CartAddBucket, Chart
+
+
+# Hourly cart-add counts per design in a ring of RING_HOURS slots, so "most
+# added to cart lately" sums at most RING_HOURS small rows per active design
+# however long the cart history is. compact() deletes rings that have gone
+# quiet.
+RING_HOURS = 7 * 24
+DEFAULT_HOURS = 24
+TOP_K = 50
+# Window totals shift as hours pass, so cached lists are only rebuilt on expiry
+TOP_K_TTL = 60
+
+
+def hour_of(now):
+    return int(now // 3600)
+
+
+def record(design_id, count=1, now=None):
+    """Add ``count`` cart additions of a design to the current hour's bucket."""
+    hour = hour_of(time.time() if now is None else now)
+    rows = CartAddBucket.objects.filter(design_id=design_id, slot=hour % RING_HOURS)
+    # count is assigned before hour: MySQL evaluates SET clauses left to right
+    bump = {
+        'count': Case(When(hour=hour, then=F('count') + count), default=Value(count)),
+        'hour': hour,
+    }
+    if not rows.update(**bump):
+        try:
+            with transaction.atomic():
+                CartAddBucket.objects.create(design_id=design_id, slot=hour % RING_HOURS, hour=hour, count=count)
+        except IntegrityError:
+            # Created concurrently since the update
+            rows.update(**bump)
+
+
+def _build(hours, hour):
+    rows = CartAddBucket.objects.filter(hour__gt=hour - hours).order_by().values('design_id').annotate(
+        total=Sum('count')
+    ).order_by('-total', 'design_id')
+    return [(row['design_id'], row['total']) for row in rows[:TOP_K]]
+
+
+def top(hours=DEFAULT_HOURS, k=TOP_K, now=None):
+    """[(design_id, additions)] of the k designs added to carts most in the last ``hours`` hours."""
+    hours = max(1, min(hours, RING_HOURS))
+    hour = hour_of(time.time() if now is None else now)
+    return topk.read(f'cart-adds:{hours}:{hour}', lambda: _build(hours, hour), TOP_K_TTL)[:k]
+
+
+def compact(now=None):
+    """Delete buckets that have dropped out of the ring; returns how many went."""
+    hour = hour_of(time.time() if now is None else now)
+    deleted, _ = CartAddBucket.objects.filter(hour__lte=hour - RING_HOURS).delete()
+    return deleted
+
+
+def rebuild(now=None):
+    """Refill the ring from the Chart rows added within it; returns the number of buckets."""
+    now = time.time() if now is None else now
+    hour = hour_of(now)
+    since = datetime.fromtimestamp((hour - RING_HOURS + 1) * 3600, tz=dt_timezone.utc)
+    counts = Counter()
+    rows = Chart.objects.filter(added_at__gte=since).values_list('design_id', 'added_at')
+    for design_id, added_at in rows.iterator(chunk_size=2000):
+        counts[(design_id, hour_of(added_at.timestamp()))] += 1
+
+    with transaction.atomic():
+        CartAddBucket.objects.all().delete()
+        CartAddBucket.objects.bulk_create(
+            [
+                CartAddBucket(design_id=design_id, slot=added % RING_HOURS, hour=added, count=count)
+                for (design_id, added), count in counts.items()
+            ],
+            batch_size=1000,
+        )
+    return len(counts)
@@ -0,0 +1,53 @@
+import hashlib
+
+from django.views.decorators.http import condition
+
+from .models import ContentVersion, PostCounterShard
+
+
+# Per-viewer version, bumped when a user's own likes or favorites change. That
+# only alters what the user sees as is_liked/is_favorited, so it moves the
+# ETags of that viewer instead of the global 'posts' version. It is a
+# ContentVersion row like the others, so every process sees the bump.
+def _viewer_name(user_id):
+    return f'viewer:{user_id}'
+
+
+def bump_viewer(user_id):
+    """Bump the user's viewer version once the surrounding transaction commits."""
+    ContentVersion.bump(_viewer_name(user_id))
+
+
+def versioned_etag(*names, vary_on_user=False, posts=None):
+    """
+    Conditional-GET decorator for function views. The ETag is derived from the
+    ContentVersion counters in ``names`` plus the full path (query string
+    included), and the viewer and their viewer version when the body is
+    personalised. A matching If-None-Match returns 304 before the view body runs.
+
+    Counter updates (likes, comments) only bump Post.cache_version. Views whose
+    body shows counters pass ``posts``, a function of the view's arguments
+    returning the Post queryset the response shows; the sum of their
+    cache_version goes into the ETag.
+
+    Apply it below @api_view/@permission_classes so authentication runs first.
+    """
+    def etag_func(request, *args, **kwargs):
+        lookup = list(names)
+        if vary_on_user:
+            # ?as_user= replaces the viewer whose likes are shown; it is in the path too
+            viewer = _viewer_name(request.GET.get('as_user') or request.user.pk or 0)
+            lookup.append(viewer)
+        versions = ContentVersion.current(*lookup)
+        parts = [f'{name}={versions[name]}' for name in names]
+        if vary_on_user:
+            parts.append(f'user={request.user.pk or 0}:{versions[viewer]}')
+        if posts is not None:
+            rows = list(posts(request, *args, **kwargs).only('id', 'cache_version', 'sharded_counters'))
+            # Deltas still in counter shards are not in cache_version until folded
+            PostCounterShard.fold_pending(rows)
+            parts.append(f'counters={sum(post.cache_version for post in rows)}')
+        parts.append(request.get_full_path())
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    return condition(etag_func=etag_func)
@@ -0,0 +1,228 @@
+import os
+import queue
+import threading
+from io import BytesIO
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+
+from .vector_store import VectorStore
+
+
+# 64 colour-histogram bins + 32 edge-orientation bins + 32 layout (tiny
+# greyscale thumbnail) values, each block L2-normalised, then the whole
+# vector normalised so a dot product is a cosine similarity.
+DIM = 128
+STORE = VectorStore('design_embeddings', DIM)
+
+HUE_BINS, SAT_BINS, VAL_BINS = 8, 4, 2
+ORIENTATION_BINS = 8
+FETCH_TIMEOUT = 10
+
+# Below this many designs a brute-force scan is cheaper than the bucket lookup
+APPROXIMATE_THRESHOLD = 50000
+# Buckets scanned per query in approximate mode
+PROBES = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 20000
+
+
+def _normalise(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_image(image):
+    """Fixed-length float32 feature vector of a PIL image."""
+    image = image.convert('RGB').resize((64, 64), Image.BILINEAR)
+
+    hsv = np.asarray(image.convert('HSV'), dtype=np.int32)
+    bins = (
+        hsv[..., 0] * HUE_BINS // 256 * SAT_BINS * VAL_BINS
+        + hsv[..., 1] * SAT_BINS // 256 * VAL_BINS
+        + hsv[..., 2] * VAL_BINS // 256
+    )
+    colour = np.bincount(bins.ravel(), minlength=HUE_BINS * SAT_BINS * VAL_BINS).astype(np.float32)
+
+    grey = np.asarray(image.convert('L'), dtype=np.float32) / 255.0
+    gy, gx = np.gradient(grey)
+    magnitude = np.hypot(gx, gy)
+    orientation = ((np.arctan2(gy, gx) % np.pi) / np.pi * ORIENTATION_BINS).astype(np.int32) % ORIENTATION_BINS
+    # Orientation histogram per image quadrant
+    quadrant = (np.arange(64)[:, None] >= 32) * 2 + (np.arange(64)[None, :] >= 32)
+    edges = np.bincount(
+        (quadrant * ORIENTATION_BINS + orientation).ravel(),
+        weights=magnitude.ravel(),
+        minlength=4 * ORIENTATION_BINS,
+    ).astype(np.float32)
+
+    layout = grey.reshape(4, 16, 8, 8).mean(axis=(1, 3)).ravel()
+    layout = layout - layout.mean()
+
+    return _normalise(np.concatenate([
+        _normalise(colour), _normalise(edges), _normalise(layout.astype(np.float32)),
+    ])).astype(np.float32)
+
+
+def embed_design(design):
+    """Fetch the design image and store its embedding. Failures are logged and skipped."""
+    return _embed(design.id, design.image_url)
+
+
+def _embed(design_id, image_url):
+    try:
+        response = requests.get(image_url, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+        vector = embed_image(Image.open(BytesIO(response.content)))
+    except Exception as e:
+        print(f"Error embedding design {design_id}: {e}")
+        return False
+    STORE.upsert(design_id, vector)
+    return True
+
+
+# Designs are embedded off the request thread: embed_later() queues them for a
+# background worker once the creating transaction commits. Queued designs are
+# lost if the process exits; rebuild_design_embeddings --missing catches up.
+_pending = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _work():
+    while True:
+        _embed(*_pending.get())
+
+
+def embed_later(design):
+    """Queue ``design`` for embedding in the background once the current transaction commits."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name='design-embeddings', daemon=True)
+            _worker.start()
+    item = (design.id, design.image_url)
+    transaction.on_commit(lambda: _pending.put(item))
+
+
+def stored_design_ids():
+    ids, vectors = STORE.arrays()
+    return set(ids[ids != 0].tolist())
+
+
+def unindex_design(design_id):
+    STORE.remove(design_id)
+
+
+# Approximate mode: k-means buckets. build_clusters() rewrites the store with
+# each bucket's rows contiguous, so a query reads only the probed row ranges
+# (plus the rows appended since the last build). Rows of deleted designs may
+# be reused by new ones inside a bucket range; such a design is only found
+# through that bucket until the next build.
+
+def clusters_path():
+    return os.path.join(settings.VECTOR_INDEX_DIR, 'design_embeddings.clusters.npz')
+
+
+_clusters = {'mtime': None, 'data': None}
+
+
+def load_clusters():
+    """Return (centroids, offsets, built_rows) or None when no bucket layout exists."""
+    try:
+        mtime = os.stat(clusters_path()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _clusters['mtime'] != mtime:
+        with np.load(clusters_path()) as data:
+            _clusters['data'] = (data['centroids'], data['offsets'], int(data['built_rows']))
+        _clusters['mtime'] = mtime
+    return _clusters['data']
+
+
+def build_clusters(n_clusters=None, seed=0):
+    """Bucket the store with k-means (about sqrt(n) buckets) and lay it out bucket by bucket."""
+    with STORE.lock():
+        ids, vectors = STORE.arrays()
+        live = np.flatnonzero(ids)
+        if not len(live):
+            return 0
+        keys = np.array(ids[live])
+        data = np.array(vectors[live])
+        n_clusters = n_clusters or max(1, int(np.sqrt(len(live))))
+
+        rng = np.random.default_rng(seed)
+        sample = data[rng.choice(len(data), min(len(data), KMEANS_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), min(n_clusters, len(sample)), replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = _normalise(members.mean(axis=0))
+
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+        STORE.rebuild(zip(keys[order], data[order]))
+
+        tmp = clusters_path() + '.tmp.npz'
+        np.savez(tmp, centroids=centroids, offsets=offsets, built_rows=len(live))
+        os.replace(tmp, clusters_path())
+    return len(centroids)
+
+
+def candidate_rows(queries, ids, force=False):
+    """Row indices to scan for ``queries`` in approximate mode, or None for a full scan."""
+    clusters = load_clusters()
+    if clusters is None or (len(ids) < APPROXIMATE_THRESHOLD and not force):
+        return None
+    centroids, offsets, built_rows = clusters
+    probes = np.unique(np.argsort(-(queries @ centroids.T), axis=1)[:, :PROBES])
+    ranges = [np.arange(offsets[c], offsets[c + 1]) for c in probes]
+    ranges.append(built_rows + np.flatnonzero(ids[built_rows:]))  # added since the last build
+    return np.concatenate(ranges)
+
+
+def similar_designs(design_ids, k=12, approximate=None):
+    """
+    {design_id: [(similar design id, cosine similarity)]} for a batch of
+    designs, all scored with one matrix product. ``approximate`` is None to
+    use the buckets once the catalogue passes APPROXIMATE_THRESHOLD, True to
+    always use them (when built), False for an exact scan.
+    """
+    results = {key: [] for key in design_ids}
+    ids, vectors = STORE.arrays()
+    rows = {}
+    for key in design_ids:
+        found = np.flatnonzero(ids == key)
+        if len(found):
+            rows[key] = found[0]
+    if not rows:
+        return results
+    queries = np.asarray(vectors[list(rows.values())])
+
+    candidates = None
+    if approximate is not False:
+        candidates = candidate_rows(queries, ids, force=bool(approximate))
+    if candidates is None:
+        candidate_ids, candidate_vectors = ids, np.asarray(vectors)
+    else:
+        candidate_ids, candidate_vectors = ids[candidates], np.asarray(vectors[candidates])
+    scores = queries @ candidate_vectors.T  # (queries, candidates)
+    scores[:, candidate_ids == 0] = -np.inf
+
+    # One extra pick per query stands in for the query design itself
+    top = min(k + 1, len(candidate_ids))
+    best = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+    for query_scores, picks, key in zip(scores, best, rows):
+        picks = picks[np.argsort(-query_scores[picks], kind='stable')]
+        results[key] = [
+            (int(candidate_ids[i]), float(query_scores[i]))
+            for i in picks
+            if candidate_ids[i] != key and np.isfinite(query_scores[i])
+        ][:k]
+    return results
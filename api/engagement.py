@@ -0,0 +1,180 @@
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .conditional import bump_viewer
+from .models import EngagementEvent, EngagementIntent, Favorite, Like, Post, counter_adjusted
+from .notifications import coalesce_engagement
+
+
+def toggle_row(model, user_id, post_id):
+    """
+    Delete ``model``'s (user, post) row if it exists, otherwise insert it.
+
+    Returns -1 when the row was deleted, +1 when it was inserted, and 0 when a
+    concurrent request inserted it first. The insert is INSERT IGNORE / ON
+    CONFLICT DO NOTHING against the (user, post) unique constraint, so a
+    double-tap never raises IntegrityError. Both statements bypass the ORM
+    signals; callers bump the viewer version themselves. Run inside a transaction.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE user_id = %s AND post_id = %s', [user_id, post_id])
+        if cursor.rowcount:
+            return -1
+
+        fields = [model._meta.get_field(name) for name in ('user', 'post', 'created_at')]
+        insert = connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)
+        suffix = connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)
+        cursor.execute(
+            f'{insert} {table} (user_id, post_id, created_at) VALUES (%s, %s, %s) {suffix}',
+            [user_id, post_id, connection.ops.adapt_datetimefield_value(timezone.now())],
+        )
+        return 1 if cursor.rowcount else 0
+
+
+# Write-behind mode (settings.ENGAGEMENT_WRITE_BEHIND): a toggle only appends an
+# EngagementIntent row, which never contends with other users' likes on the
+# same post. flush_intents() later applies the intents in batches.
+
+KIND_MODELS = {'like': Like, 'favorite': Favorite}
+COUNTERS = {'like': 'like_count', 'favorite': 'favorite_count'}
+
+
+def pending_states(user_id, post_ids):
+    """{(post_id, kind): active} from the user's unapplied intents; the latest one wins."""
+    rows = EngagementIntent.objects.filter(user_id=user_id, post_id__in=post_ids).order_by('id')
+    return {(post_id, kind): active for post_id, kind, active in rows.values_list('post_id', 'kind', 'active')}
+
+
+def record_intent(kind, user_id, post_id):
+    """
+    Queue a toggle of ``kind``. Returns (change, offset): the predicted change
+    (+1 or -1), and how far the post's stored counter will move once this
+    user's intents are applied (-1, 0 or +1).
+    """
+    applied = KIND_MODELS[kind].objects.filter(user_id=user_id, post_id=post_id).exists()
+    current = pending_states(user_id, [post_id]).get((post_id, kind), applied)
+    EngagementIntent.objects.create(user_id=user_id, post_id=post_id, kind=kind, active=not current)
+    # The viewer's feeds now show the predicted state (see resolve_viewer_state)
+    bump_viewer(user_id)
+    return (-1 if current else 1), int(not current) - int(applied)
+
+
+def _pairs_filter(pairs):
+    return reduce(or_, (Q(user_id=user_id, post_id=post_id) for user_id, post_id in pairs))
+
+
+def flush_intents(batch_size=1000):
+    """
+    Apply up to ``batch_size`` queued intents in one transaction and return how
+    many were consumed. Only the latest intent per (user, post, kind) counts, so
+    like/unlike flip-flops collapse to their final state (or to nothing).
+    """
+    with transaction.atomic():
+        intents = list(
+            EngagementIntent.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size]
+        )
+        if not intents:
+            return 0
+
+        wanted = {}
+        for intent in intents:
+            wanted[(intent.kind, intent.user_id, intent.post_id)] = intent.active
+        posts = Post.objects.select_related('design').only(
+            'id', 'user_id', 'sharded_counters', 'design__id', 'design__user_id'
+        ).in_bulk({post_id for kind, user_id, post_id in wanted})
+
+        deltas = Counter()
+        actors = {}  # (kind, design) -> users who added a like / favorite, for every changed design
+        for kind, model in KIND_MODELS.items():
+            pairs = {(user_id, post_id): active for (k, user_id, post_id), active in wanted.items() if k == kind and post_id in posts}
+            if not pairs:
+                continue
+            existing = set(model.objects.filter(_pairs_filter(pairs)).values_list('user_id', 'post_id'))
+            added = [pair for pair, active in pairs.items() if active and pair not in existing]
+            removed = [pair for pair, active in pairs.items() if not active and pair in existing]
+
+            if added:
+                model.objects.bulk_create([model(user_id=u, post_id=p) for u, p in added], ignore_conflicts=True)
+            if removed:
+                model.objects.filter(_pairs_filter(removed)).delete()
+
+            for u, p in added:
+                deltas[(p, COUNTERS[kind])] += 1
+                actors.setdefault((kind, posts[p].design), set()).add(u)
+            for u, p in removed:
+                deltas[(p, COUNTERS[kind])] -= 1
+                actors.setdefault((kind, posts[p].design), set())
+
+        for (post_id, field), delta in deltas.items():
+            if delta:
+                posts[post_id].adjust_counter(field, delta)
+        for user_id in {user_id for (kind, user_id, post_id), active in wanted.items()}:
+            bump_viewer(user_id)
+        for (kind, design), actor_ids in actors.items():
+            transaction.on_commit(_notify(kind, design, actor_ids))
+        EngagementIntent.objects.filter(id__in=[intent.id for intent in intents]).delete()
+    return len(intents)
+
+
+# A like/favorite change moves the post's counter and the author's
+# received_likes in its own transaction. What can lag runs after it commits:
+# the design owner's coalesced notification, and counter_adjusted (trending,
+# leaderboards), which settings.ENGAGEMENT_EVENTS_WORKER hands to
+# flush_engagement instead so a toggle costs no more than its transaction.
+
+def _notify(kind, design, actor_ids):
+    """An on_commit callback bringing the owner's notification for ``design`` up to date."""
+    if design.user_id is None:
+        return lambda: None
+    rows = KIND_MODELS[kind].objects.filter(post__design_id=design.id)
+    return lambda: coalesce_engagement(design.user_id, design.id, kind, rows, actor_ids)
+
+
+def record_change(kind, post, user_id, change):
+    """
+    Account for a like/favorite row the caller just inserted (``change`` +1)
+    or deleted (-1), inside the same transaction. ``post`` needs its design
+    loaded.
+    """
+    deferred = settings.ENGAGEMENT_EVENTS_WORKER
+    post.adjust_counter(COUNTERS[kind], change, side_effects=not deferred)
+    if deferred:
+        EngagementEvent.objects.create(user_id=user_id, post_id=post.id, kind=kind, delta=change)
+    bump_viewer(user_id)
+    transaction.on_commit(_notify(kind, post.design, [user_id] if change > 0 else []))
+
+
+def apply_events(batch_size=1000):
+    """
+    Send counter_adjusted for up to ``batch_size`` recorded changes in one
+    transaction and return how many were consumed. Deltas are netted per post
+    first, so a burst of likes on one post costs one trending and one
+    leaderboard update.
+    """
+    with transaction.atomic():
+        events = list(EngagementEvent.objects.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+        if not events:
+            return 0
+
+        posts = Post.objects.only('id', 'user_id', 'design_id').in_bulk({event.post_id for event in events})
+        deltas = Counter()
+        for event in events:
+            deltas[(event.post_id, COUNTERS[event.kind])] += event.delta
+        for (post_id, field), delta in deltas.items():
+            if delta:
+                counter_adjusted.send(sender=Post, post=posts[post_id], field=field, delta=delta)
+        EngagementEvent.objects.filter(id__in=[event.id for event in events]).delete()
+    return len(events)
+
+
+def pending_deltas(post, kind):
+    """Net change of ``post``'s ``kind`` rows whose counter_adjusted is still queued."""
+    return EngagementEvent.objects.filter(post=post, kind=kind).aggregate(total=Sum('delta'))['total'] or 0
@@ -0,0 +1,72 @@
+import hashlib
+import json
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import ContentVersion, Design
+
+
+FACETS = ('theclass', 'modell', 'type', 'stock')
+# Entries are keyed by the 'designs' content version, so the TTL only bounds memory
+FACETS_TTL = 3600
+
+
+def parse_filters(params):
+    """Pick the facet filters out of query params; stock accepts true/false/1/0."""
+    filters = {}
+    for facet in FACETS:
+        value = params.get(facet)
+        if value is None or value == '':
+            continue
+        if facet == 'stock':
+            value = value.lower() in ('1', 'true', 'yes')
+        filters[facet] = value
+    return filters
+
+
+def compute_facets(filters, query=''):
+    """
+    {facet: [{'value', 'count'}]} for every facet, most common first.
+
+    One GROUP BY over all four facet columns returns the count of each value
+    combination; every facet is then tallied from those rows in Python. Each
+    facet's counts honour the filters on the *other* facets but not its own,
+    so the UI can show how many designs picking another value would give.
+    """
+    designs = Design.objects.all()
+    if query:
+        designs = designs.filter(
+            Q(theclass__icontains=query) | Q(modell__icontains=query)
+            | Q(type__icontains=query) | Q(sku__icontains=query)
+        )
+    groups = designs.order_by().values(*FACETS).annotate(count=Count('id'))
+
+    tallies = {facet: Counter() for facet in FACETS}
+    for group in groups:
+        for facet in FACETS:
+            others_match = all(group[other] == value for other, value in filters.items() if other != facet)
+            if others_match:
+                tallies[facet][group[facet]] += group['count']
+
+    return {
+        facet: [
+            {'value': value, 'count': count}
+            for value, count in tally.most_common()
+            if value not in (None, '')
+        ]
+        for facet, tally in tallies.items()
+    }
+
+
+def get_facets(filters, query=''):
+    """compute_facets() through the cache, one entry per filter combination."""
+    version = ContentVersion.current('designs')['designs']
+    raw = json.dumps([sorted(filters.items()), query.strip().lower()])
+    key = f'design-facets:{version}:{hashlib.md5(raw.encode()).hexdigest()}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filters, query.strip())
+        cache.set(key, facets, timeout=FACETS_TTL)
+    return facets
@@ -0,0 +1,37 @@
+import hashlib
+
+from django.core.cache import cache
+
+
+# Fragments are keyed by Post.cache_version, so likes/comments/favorites and
+# edits invalidate them immediately. The TTL only bounds staleness from data
+# that lives on other rows (author profile, commenter avatars).
+FRAGMENT_TTL = 300
+
+# Fields that depend on who is looking; never stored in a fragment
+VIEWER_FIELDS = ('is_liked', 'is_favorited')
+
+
+def fragment_variant(field_names, comments_preview):
+    """Short digest of the options that change a post's rendered shape."""
+    raw = f"{','.join(sorted(field_names))}|{comments_preview}"
+    return hashlib.md5(raw.encode()).hexdigest()[:12]
+
+
+def fragment_key(post, variant):
+    return f'post-fragment:{post.id}:{post.cache_version}:{variant}'
+
+
+def get_fragments(posts, variant):
+    """Return {post_id: fragment} for every post with a cached fragment."""
+    keys = {fragment_key(post, variant): post.id for post in posts}
+    found = cache.get_many(list(keys))
+    return {keys[key]: fragment for key, fragment in found.items()}
+
+
+def set_fragments(fragments, variant):
+    """Store {post: fragment} for later requests."""
+    cache.set_many(
+        {fragment_key(post, variant): fragment for post, fragment in fragments.items()},
+        timeout=FRAGMENT_TTL,
+    )
@@ -0,0 +1,142 @@
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import topk
+from .models import LeaderboardTotal, Like, Post
+
+
+# Per-user totals live in LeaderboardTotal, one row per (metric, window,
+# period), and are adjusted as likes and posts come and go. Each board's
+# best TOP_K users are kept in the cache (api/topk.py), so a read is one
+# cache hit plus the lookup of the few users shown.
+METRICS = ('likes', 'posts')
+WINDOWS = ('all', 'week', 'month')
+TOP_K = 20
+TOP_K_TTL = 600
+
+
+def period_of(window, when):
+    """Period number of ``when`` in ``window``: 0, ISO year*100+week, or year*100+month."""
+    if window == 'all':
+        return 0
+    if window == 'week':
+        year, week, _ = when.isocalendar()
+        return year * 100 + week
+    return when.year * 100 + when.month
+
+
+def period_start(window, when):
+    """Start of the period containing ``when``, or None for 'all'."""
+    if window == 'all':
+        return None
+    start = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == 'week':
+        return start - timedelta(days=start.weekday())
+    return start.replace(day=1)
+
+
+def _cache_key(metric, window, period):
+    return f'leaderboard:{metric}:{window}:{period}'
+
+
+def _periods_filter(windows, when):
+    return reduce(or_, (Q(window=window, period=period_of(window, when)) for window in windows))
+
+
+def add(user_id, metric, delta, when=None, windows=WINDOWS):
+    """Add ``delta`` to a user's ``metric`` in the period of ``when`` (default now) of each window."""
+    if not user_id or not delta:
+        return
+    when = when or timezone.now()
+    rows = LeaderboardTotal.objects.filter(_periods_filter(windows, when), user_id=user_id, metric=metric)
+    if rows.update(total=Greatest(F('total') + delta, 0)) < len(windows) and delta > 0:
+        existing = set(rows.values_list('window', flat=True))
+        for window in windows:
+            if window in existing:
+                continue
+            try:
+                with transaction.atomic():
+                    LeaderboardTotal.objects.create(
+                        user_id=user_id, metric=metric, window=window, period=period_of(window, when), total=delta,
+                    )
+            except IntegrityError:
+                # Created concurrently since the update
+                rows.filter(window=window).update(total=F('total') + delta)
+
+    for window, period, total in rows.values_list('window', 'period', 'total'):
+        topk.offer(_cache_key(metric, window, period), user_id, total, TOP_K, TOP_K_TTL)
+
+
+def release_post(post, pending_likes=0):
+    """
+    Take a post that is about to be deleted, and the likes it received in each
+    window's current period, off its author's totals once the delete commits.
+    ``pending_likes`` is the net like change not yet added to the totals.
+    """
+    now = timezone.now()
+    likes = {}
+    for window in WINDOWS:
+        since = period_start(window, now)
+        rows = Like.objects.filter(post=post)
+        likes[window] = max(0, (rows if since is None else rows.filter(created_at__gte=since)).count() - pending_likes)
+
+    def apply():
+        for window, count in likes.items():
+            add(post.user_id, 'likes', -count, when=now, windows=(window,))
+        add(post.user_id, 'posts', -1, when=post.created_at)
+    transaction.on_commit(apply)
+
+
+def _build(metric, window, period):
+    rows = LeaderboardTotal.objects.filter(metric=metric, window=window, period=period, total__gt=0)
+    return list(rows.order_by('-total', 'user_id').values_list('user_id', 'total')[:TOP_K])
+
+
+def top(metric, window='all', k=TOP_K, when=None):
+    """[(user_id, total)] of the k (at most TOP_K) best users of the current period, best first."""
+    period = period_of(window, when or timezone.now())
+    return topk.read(_cache_key(metric, window, period), lambda: _build(metric, window, period), TOP_K_TTL)[:k]
+
+
+def totals(user_ids, window='all', when=None):
+    """{user_id: {metric: total}} for the current period of ``window``."""
+    period = period_of(window, when or timezone.now())
+    result = {user_id: dict.fromkeys(METRICS, 0) for user_id in user_ids}
+    rows = LeaderboardTotal.objects.filter(user_id__in=user_ids, window=window, period=period)
+    for user_id, metric, total in rows.values_list('user_id', 'metric', 'total'):
+        result[user_id][metric] = total
+    return result
+
+
+def rebuild(when=None):
+    """Recompute the current period of every window from the posts and likes tables."""
+    when = when or timezone.now()
+    rows = []
+    for window in WINDOWS:
+        since = period_start(window, when)
+        period = period_of(window, when)
+        posts = Post.objects.all() if since is None else Post.objects.filter(created_at__gte=since)
+        likes = Like.objects.all() if since is None else Like.objects.filter(created_at__gte=since)
+        counts = {
+            'posts': posts.order_by().values_list('user_id').annotate(n=Count('id')),
+            'likes': likes.order_by().values_list('post__user_id').annotate(n=Count('id')),
+        }
+        for metric, grouped in counts.items():
+            rows.extend(
+                LeaderboardTotal(user_id=user_id, metric=metric, window=window, period=period, total=n)
+                for user_id, n in grouped
+            )
+
+    with transaction.atomic():
+        LeaderboardTotal.objects.all().delete()
+        LeaderboardTotal.objects.bulk_create(rows, batch_size=1000)
+    for metric in METRICS:
+        for window in WINDOWS:
+            topk.drop(_cache_key(metric, window, period_of(window, when)))
+    return len(rows)
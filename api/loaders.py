@@ -0,0 +1,66 @@
+from django.db.models import prefetch_related_objects
+
+
+class DataLoader:
+    """
+    Request-scoped batch loader for the rows serializers reach through foreign keys.
+
+    ``load(instances, 'user', 'design')`` collects the foreign key ids of every
+    instance that does not have the relation cached yet and fetches each related
+    model with one ``pk IN (...)`` query. Fetched rows are kept in an identity
+    map for the rest of the request, so a post author who also commented, or a
+    design shared by several notifications, is only loaded once.
+    """
+
+    def __init__(self):
+        self._rows = {}  # model -> {pk: instance}
+
+    def load(self, instances, *relations):
+        instances = [instance for instance in instances if instance is not None]
+        if not instances:
+            return
+        for name in relations:
+            field = instances[0]._meta.get_field(name)
+            if field.many_to_many or field.one_to_many:
+                prefetch_related_objects(instances, name)
+            else:
+                self._load_foreign_key(instances, field)
+
+    def _load_foreign_key(self, instances, field):
+        rows = self._rows.setdefault(field.related_model, {})
+
+        missing = set()
+        for instance in instances:
+            if field.is_cached(instance):
+                related = field.get_cached_value(instance)
+                if related is not None:
+                    rows.setdefault(related.pk, related)
+            else:
+                missing.add(getattr(instance, field.attname))
+        missing.discard(None)
+        missing.difference_update(rows)
+
+        if missing:
+            for row in field.related_model._default_manager.filter(pk__in=missing):
+                rows[row.pk] = row
+
+        for instance in instances:
+            if field.is_cached(instance):
+                continue
+            key = getattr(instance, field.attname)
+            if key is None:
+                field.set_cached_value(instance, None)
+            elif key in rows:
+                field.set_cached_value(instance, rows[key])
+
+
+def get_loader(context):
+    """Return the DataLoader for this request (or for this serializer context when there is no request)."""
+    request = context.get('request')
+    if request is None:
+        return context.setdefault('dataloader', DataLoader())
+    request = getattr(request, '_request', request)
+    loader = getattr(request, '_dataloader', None)
+    if loader is None:
+        loader = request._dataloader = DataLoader()
+    return loader
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api import cart_activity
+
+
+class Command(BaseCommand):
+    help = 'Deletes hourly cart-add buckets that have fallen out of the ring'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Refill the ring from the cart table instead')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            written = cart_activity.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written} cart-add buckets'))
+        else:
+            deleted = cart_activity.compact()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired cart-add buckets'))
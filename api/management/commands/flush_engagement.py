@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.engagement import apply_events, flush_intents
+
+
+class Command(BaseCommand):
+    help = 'Applies queued write-behind like/favorite intents, then the trending/leaderboard updates of recorded like/favorite changes, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Intents or events applied per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep running, polling for new intents and events')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty (with --loop)')
+
+    def handle(self, *args, **options):
+        intents = events = 0
+        while True:
+            flushed = flush_intents(options['batch_size'])
+            applied = apply_events(options['batch_size'])
+            intents += flushed
+            events += applied
+            if flushed or applied:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Applied {intents} intents and {events} events'))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.models import PostCounterShard
+
+
+class Command(BaseCommand):
+    help = 'Folds the sharded like/comment/favorite counters of hot posts into their Post columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, folding every --interval seconds')
+        parser.add_argument('--interval', type=float, default=PostCounterShard.FOLD_INTERVAL, help='Seconds between passes (with --loop)')
+
+    def handle(self, *args, **options):
+        while True:
+            PostCounterShard.fold_all()
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Folded counter shards'))
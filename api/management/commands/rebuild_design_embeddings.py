@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api import design_embeddings
+from api.models import Design
+
+
+class Command(BaseCommand):
+    help = 'Re-embeds every design image, then rebuilds the approximate-search buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clusters-only', action='store_true', help='Only rebuild the buckets from stored embeddings')
+        parser.add_argument('--missing', action='store_true', help='Only embed designs that have no embedding yet')
+        parser.add_argument('--clusters', type=int, default=None, help='Number of buckets (default: sqrt of the design count)')
+
+    def handle(self, *args, **options):
+        if not options['clusters_only']:
+            stored = design_embeddings.stored_design_ids() if options['missing'] else set()
+            embedded = 0
+            for design in Design.objects.only('id', 'image_url').iterator(chunk_size=500):
+                if design.id not in stored:
+                    embedded += design_embeddings.embed_design(design)
+            self.stdout.write(f'Embedded {embedded} designs')
+
+        buckets = design_embeddings.build_clusters(options['clusters'])
+        self.stdout.write(self.style.SUCCESS(f'Built {buckets} buckets'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api import leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the all-time, weekly and monthly user leaderboards from posts and likes'
+
+    def handle(self, *args, **options):
+        written = leaderboards.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} leaderboard totals'))
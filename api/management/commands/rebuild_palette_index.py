@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api import palette_index
+from api.models import Design
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the design colour palette index from Design.color1..color3'
+
+    def handle(self, *args, **options):
+        designs = Design.objects.only('id', 'color1', 'color2', 'color3').iterator(chunk_size=2000)
+        indexed = palette_index.rebuild(designs)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} design palettes'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.search_index import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the post search index from scratch, one id range at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Number of posts indexed per batch')
+
+    def handle(self, *args, **options):
+        indexed = rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} posts'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api import trending
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the trending scores from recent likes, comments, favorites and cart additions'
+
+    def handle(self, *args, **options):
+        written = trending.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} trending scores'))
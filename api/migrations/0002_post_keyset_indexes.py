@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='post_user_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:49
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('api', 'Post')
+
+    def count_of(model_name):
+        model = apps.get_model('api', model_name)
+        rows = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(c=Count('id')).values('c')
+        return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+    Post.objects.update(
+        like_count=count_of('Like'),
+        comment_count=count_of('Comment'),
+        favorite_count=count_of('Favorite'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_post_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
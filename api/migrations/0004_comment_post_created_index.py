@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_post_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_id_idx'),
+        ),
+    ]
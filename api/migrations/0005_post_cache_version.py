@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_comment_post_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
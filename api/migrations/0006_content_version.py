@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_post_cache_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
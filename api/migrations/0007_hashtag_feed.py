@@ -0,0 +1,88 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:55
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def merge_case_duplicate_hashtags(apps, schema_editor):
+    """Fold '#Cats' / '#cats' into the oldest tag so the LOWER(name) constraint can be added."""
+    Hashtag = apps.get_model('api', 'Hashtag')
+    Post = apps.get_model('api', 'Post')
+    Link = Post.hashtags.through
+
+    canonical = {}
+    for hashtag in Hashtag.objects.order_by('id'):
+        key = hashtag.name.lower()
+        keep = canonical.setdefault(key, hashtag)
+        if keep.pk == hashtag.pk:
+            continue
+        tagged = set(Link.objects.filter(hashtag_id=keep.pk).values_list('post_id', flat=True))
+        for link in Link.objects.filter(hashtag_id=hashtag.pk):
+            if link.post_id in tagged:
+                link.delete()
+            else:
+                link.hashtag_id = keep.pk
+                link.save()
+        hashtag.delete()
+
+
+def backfill_post_created_at(apps, schema_editor):
+    PostHashtag = apps.get_model('api', 'PostHashtag')
+    Post = apps.get_model('api', 'Post')
+    PostHashtag.objects.update(
+        post_created_at=Subquery(Post.objects.filter(pk=OuterRef('post_id')).values('created_at')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_content_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_case_duplicate_hashtags, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='hashtag',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='hashtag_name_ci_unique'),
+        ),
+        # Adopt the existing auto-created join table as an explicit through model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PostHashtag',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.post')),
+                        ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.hashtag')),
+                    ],
+                    options={
+                        'db_table': 'api_post_hashtags',
+                        'unique_together': {('post', 'hashtag')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='hashtags',
+                    field=models.ManyToManyField(blank=True, through='api.PostHashtag', to='api.hashtag'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='posthashtag',
+            name='post_created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_post_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='posthashtag',
+            name='post_created_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='posthashtag',
+            index=models.Index(fields=['hashtag', '-post_created_at', '-post'], name='posthashtag_tag_created_idx'),
+        ),
+    ]
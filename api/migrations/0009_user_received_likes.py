@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:11
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_received_likes(apps, schema_editor):
+    CustomUser = apps.get_model('api', 'CustomUser')
+    Like = apps.get_model('api', 'Like')
+    rows = Like.objects.filter(post__user=OuterRef('pk')).order_by().values('post__user').annotate(c=Count('id')).values('c')
+    CustomUser.objects.update(received_likes=Coalesce(Subquery(rows, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='received_likes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_received_likes, migrations.RunPython.noop),
+    ]
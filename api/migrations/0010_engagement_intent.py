@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_user_received_likes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EngagementIntent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('like', 'Like'), ('favorite', 'Favorite')], max_length=10)),
+                ('active', models.BooleanField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'post', 'kind', '-id'], name='intent_user_post_kind_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_engagement_intent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='sharded_counters',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='PostCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=20)),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('value', models.BigIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='api.post')),
+            ],
+            options={
+                'unique_together': {('post', 'field', 'slot')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_post_counter_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=20)),
+                ('era', models.IntegerField()),
+                ('score', models.FloatField(default=0)),
+                ('design', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_scores', to='api.design')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', 'era', '-score'], name='trending_board_era_score_idx')],
+                'unique_together': {('board', 'design')},
+            },
+        ),
+    ]
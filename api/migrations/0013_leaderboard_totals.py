@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_trending_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=10)),
+                ('window', models.CharField(max_length=10)),
+                ('period', models.IntegerField()),
+                ('total', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['metric', 'window', 'period', '-total'], name='leaderboard_rank_idx')],
+                'unique_together': {('user', 'metric', 'window', 'period')},
+            },
+        ),
+    ]
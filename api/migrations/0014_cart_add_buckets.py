@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_leaderboard_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartAddBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('hour', models.IntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('design', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_add_buckets', to='api.design')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='cart_bucket_hour_idx')],
+                'unique_together': {('design', 'slot')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:22
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_notifications(apps, schema_editor):
+    CustomUser = apps.get_model('api', 'CustomUser')
+    Notification = apps.get_model('api', 'Notification')
+    rows = Notification.objects.filter(user=OuterRef('pk'), is_read=False).order_by().values('user').annotate(c=Count('id')).values('c')
+    CustomUser.objects.update(unread_notifications=Coalesce(Subquery(rows, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_cart_add_buckets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_notifications, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='notif_user_read_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_notification_unread_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='sample_actors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
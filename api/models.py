@@ -1,11 +1,37 @@
 # models.py
-from django.db import models
+import random
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Sum, F
+from django.db.models.functions import Greatest, Lower
+from django.dispatch import Signal
+
+
+# Likes a user's posts need in total before their purchases are discounted
+DISCOUNT_LIKES_THRESHOLD = 4
+
+# Sent by Post.adjust_counter with post, field and delta (see api/trending.py)
+counter_adjusted = Signal()
+# Sent by CustomUser.adjust_received_likes with user_id and delta (see api/suggest.py)
+received_likes_adjusted = Signal()
 
 
+def clamped_add(field, delta):
+    """
+    F(field) + delta, floored at zero. A decrement is applied to at least
+    -delta, so no intermediate value is negative (MySQL rejects those on
+    unsigned columns).
+    """
+    if delta < 0:
+        return Greatest(F(field), -delta) + delta
+    return F(field) + delta
+
 
 class Hashtag(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -13,6 +39,31 @@ class Hashtag(models.Model):
     def __str__(self):
         return f"#{self.name}"
 
+    class Meta:
+        constraints = [
+            # '#Cats' and '#cats' are the same tag; lookups go through LOWER(name)
+            models.UniqueConstraint(Lower('name'), name='hashtag_name_ci_unique'),
+        ]
+
+    @classmethod
+    def get_by_name(cls, name):
+        """Case-insensitive lookup served by the LOWER(name) unique index."""
+        return cls.objects.annotate(name_lower=Lower('name')).filter(name_lower=name.strip().lower()).first()
+
+
+class PostHashtag(models.Model):
+    """Post <-> Hashtag link, carrying the post's created_at so a tag feed is one index range scan."""
+    post = models.ForeignKey('Post', on_delete=models.CASCADE)
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE)
+    post_created_at = models.DateTimeField()  # Copy of Post.created_at (never changes)
+
+    class Meta:
+        db_table = 'api_post_hashtags'
+        unique_together = ('post', 'hashtag')
+        indexes = [
+            models.Index(fields=['hashtag', '-post_created_at', '-post'], name='posthashtag_tag_created_idx'),
+        ]
+
 
 
 class Post(models.Model):
@@ -20,12 +71,76 @@ class Post(models.Model):
     design = models.ForeignKey('Design', on_delete=models.CASCADE, related_name='posts')  # Reference to the design
     caption = models.CharField(max_length=255)  # Caption for the post
     description = models.TextField()  # Detailed description of the post
-    hashtags = models.ManyToManyField(Hashtag, blank=True)
+    hashtags = models.ManyToManyField(Hashtag, blank=True, through='PostHashtag')
     created_at = models.DateTimeField(auto_now_add=True)  # Date of post creation
 
+    # Denormalized engagement counters, kept in step with Like/Comment/Favorite rows
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    favorite_count = models.PositiveIntegerField(default=0)
+    # Bumped whenever the post's rendered form changes; part of the fragment cache key
+    cache_version = models.PositiveIntegerField(default=0)
+    # Hot posts take counter writes in PostCounterShard rows instead of these columns
+    sharded_counters = models.BooleanField(default=False)
+
     def __str__(self):
         return f"Post by {self.user.username} on {self.created_at}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.cache_version += 1
+        super().save(*args, **kwargs)
+
+    def add_hashtags(self, names):
+        """Attach up to five hashtags, reusing existing tags case-insensitively."""
+        for tag in names[:5]:
+            tag = tag.strip() if tag else ''
+            if not tag:
+                continue
+            hashtag, created = Hashtag.objects.get_or_create(name__iexact=tag, defaults={'name': tag})
+            self.hashtags.add(hashtag, through_defaults={'post_created_at': self.created_at})
+
+    def adjust_counter(self, field, delta, side_effects=True):
+        """
+        Atomically add ``delta`` to one of the engagement counters with an F() update.
+        Decrements never take a counter below zero. Also bumps cache_version
+        and, for likes, the author's received_likes; call it inside the
+        transaction that creates or deletes the row. Hot posts are switched to
+        sharded counters (see PostCounterShard).
+
+        With ``side_effects`` it also sends counter_adjusted (trending,
+        leaderboards). Like/favorite changes pass False when they record an
+        EngagementEvent instead, whose apply_events (api/engagement.py) sends it
+        later in batches.
+        """
+        if side_effects:
+            counter_adjusted.send(sender=Post, post=self, field=field, delta=delta)
+        if field == 'like_count':
+            CustomUser.adjust_received_likes(self.user_id, delta)
+        if self.sharded_counters:
+            PostCounterShard.add(self, field, delta)
+            return
+
+        Post.objects.filter(pk=self.pk).update(
+            **{field: clamped_add(field, delta), 'cache_version': F('cache_version') + 1}
+        )
+        if PostCounterShard.record_write(self.pk):
+            PostCounterShard.promote(self)
+
+    def counter_value(self, field):
+        """Current value of a counter, including deltas still sitting in shards."""
+        value = Post.objects.filter(pk=self.pk).values_list(field, flat=True).first() or 0
+        if self.sharded_counters:
+            value += PostCounterShard.objects.filter(post=self, field=field).aggregate(total=Sum('value'))['total'] or 0
+        return max(0, value)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination for the feeds walks (created_at, id) newest first
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='post_user_created_id_idx'),
+        ]
+
 
 class Design(models.Model):
     image_url = models.URLField()  # The image URL of the design
@@ -80,12 +195,23 @@ class Notification(models.Model):
     message = models.CharField(max_length=255)  # The message that will be shown to the user
     is_read = models.BooleanField(default=False)  # To check whether the notification has been read
     created_at = models.DateTimeField(auto_now_add=True)  # The time when the notification was created
+    # Likes / favorites of one design are merged into one unread row (api/notifications.py):
+    # how many users it covers, and the usernames of the latest few. action_user is the latest.
+    actor_count = models.PositiveIntegerField(default=1)
+    sample_actors = models.JSONField(default=list, blank=True)
+    # Start of the merged group: it covers the users whose like / favorite is not older
+    opened_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.notification_type} - {self.created_at}"
 
     class Meta:
         ordering = ['-created_at']  # Notifications are ordered by creation date (most recent first)
+        indexes = [
+            # Keyset pages of a user's notifications, optionally unread only
+            models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='notif_user_read_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_idx'),
+        ]
 
 
 class CustomUser(AbstractUser):
@@ -101,7 +227,10 @@ class CustomUser(AbstractUser):
         default='active'
     )
     suspension_end_date = models.DateTimeField(null=True, blank=True)
-    is_discount_eligible = models.BooleanField(default=False)
+    # Likes on this user's posts, kept in step by Post.adjust_counter
+    received_likes = models.PositiveIntegerField(default=0)
+    # Unread notifications, for the badge; kept in step by api/signals.py and mark_as_read
+    unread_notifications = models.PositiveIntegerField(default=0)
     profile_pic = models.URLField(
         max_length=500,
         blank=True,
@@ -124,10 +253,33 @@ class CustomUser(AbstractUser):
     )
 
 
+    # Only ever changed with F() updates; a plain save() of a loaded user leaves
+    # them out so it cannot overwrite increments made since the user was read
+    COUNTER_FIELDS = ('received_likes', 'unread_notifications')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def is_discount_eligible(self):
-        # Check if the user's posts have received at least two likes
-        return Like.objects.filter(post__user=self).count() >= 4 
+        # Eligible once the user's posts have received enough likes
+        return self.received_likes >= DISCOUNT_LIKES_THRESHOLD
         
+    @classmethod
+    def adjust_received_likes(cls, user_id, delta):
+        """F() update of received_likes that never goes below zero."""
+        cls.objects.filter(pk=user_id).update(received_likes=clamped_add('received_likes', delta))
+        received_likes_adjusted.send(sender=cls, user_id=user_id, delta=delta)
+
+    @classmethod
+    def adjust_unread_notifications(cls, user_id, delta):
+        """F() update of unread_notifications that never goes below zero."""
+        cls.objects.filter(pk=user_id).update(unread_notifications=clamped_add('unread_notifications', delta))
+
     def update_profile(self, first_name=None, last_name=None, email=None):
         if first_name is not None:
             self.first_name = first_name
@@ -161,6 +313,12 @@ class Comment(models.Model):
     def __str__(self):
         return f"Comment by {self.user.username} on Post {self.post.id}"
 
+    class Meta:
+        indexes = [
+            # Serves both the per-post preview window and the paginated thread
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_id_idx'),
+        ]
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -237,11 +395,8 @@ class UserDiscount(models.Model):
         return valid_by_time and valid_by_likes
 
     def calculate_total_likes(self):
-        # Calculate the total likes across all posts by this user using aggregate for efficiency
-        total_likes = Post.objects.filter(user=self.user).aggregate(
-            total_likes=Sum('likes__count')
-        )['total_likes'] or 0
-        return total_likes
+        # Total likes across all posts by this user (stored on the user)
+        return self.user.received_likes
 
     def apply_discount(self, price):
         if self.is_valid():
@@ -309,4 +464,246 @@ class PhoneProduct(models.Model):
     class Meta:
         unique_together = ('type', 'modell')  # Prevent duplicate products
 
+
+class ContentVersion(models.Model):
+    """
+    Monotonic per-table version counters. Endpoints derive their ETag from
+    these, so a conditional GET costs one primary-key lookup.
+    """
+    name = models.CharField(max_length=50, unique=True)  # e.g. 'posts', 'announcements'
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    @classmethod
+    def bump(cls, *names):
+        """Increment the named counters once the surrounding transaction commits."""
+        def apply():
+            for name in names:
+                if not cls.objects.filter(name=name).update(version=F('version') + 1):
+                    cls.objects.get_or_create(name=name, defaults={'version': 1})
+        transaction.on_commit(apply)
+
+    @classmethod
+    def current(cls, *names):
+        """Return {name: version} for ``names`` in one query (missing names read as 0)."""
+        versions = dict(cls.objects.filter(name__in=names).values_list('name', 'version'))
+        return {name: versions.get(name, 0) for name in names}
+
+
+class PostCounterShard(models.Model):
+    """
+    One of SHARD_COUNT slots holding counter deltas for a hot post that have
+    not been folded into the Post columns yet. Each write picks a random slot,
+    so concurrent likes on a viral post lock different rows instead of queueing
+    on the post row. fold() moves the slot totals into the columns at most
+    every FOLD_INTERVAL seconds per post: after a write, and when the post is
+    read with deltas left over (fold_pending), plus `manage.py
+    fold_counter_shards`. The columns lag by a few seconds while a post is hot.
+    """
+    SHARD_COUNT = 16
+    # Counter writes per minute on one post that switch it to sharded mode
+    HOT_WRITES_PER_MINUTE = 120
+    FOLD_INTERVAL = 2
+    FIELDS = ('like_count', 'comment_count', 'favorite_count')
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='counter_shards')
+    field = models.CharField(max_length=20)
+    slot = models.PositiveSmallIntegerField()
+    value = models.BigIntegerField(default=0)  # Net unfolded delta; may be negative
+
+    class Meta:
+        unique_together = ('post', 'field', 'slot')
+
+    @classmethod
+    def record_write(cls, post_id):
+        """Count a counter write on ``post_id``; True once it crosses HOT_WRITES_PER_MINUTE."""
+        key = f'counter-writes:{post_id}:{int(time.time() // 60)}'
+        cache.add(key, 0, timeout=120)
+        try:
+            return cache.incr(key) >= cls.HOT_WRITES_PER_MINUTE
+        except ValueError:  # evicted between add and incr
+            return False
+
+    @classmethod
+    def promote(cls, post):
+        cls.objects.bulk_create(
+            [cls(post_id=post.pk, field=field, slot=slot) for field in cls.FIELDS for slot in range(cls.SHARD_COUNT)],
+            ignore_conflicts=True,
+        )
+        Post.objects.filter(pk=post.pk).update(sharded_counters=True)
+        post.sharded_counters = True
+
+    @classmethod
+    def may_fold(cls, post_id):
+        """True at most once per FOLD_INTERVAL for a post."""
+        return cache.add(f'counter-fold:{post_id}', 1, timeout=cls.FOLD_INTERVAL)
+
+    @classmethod
+    def add(cls, post, field, delta):
+        cls.objects.filter(
+            post_id=post.pk, field=field, slot=random.randrange(cls.SHARD_COUNT)
+        ).update(value=F('value') + delta)
+        if cls.may_fold(post.pk):
+            transaction.on_commit(lambda: cls.fold(post.pk))
+
+    @classmethod
+    def fold_pending(cls, posts):
+        """
+        Fold the sharded ``posts`` that still hold deltas and update the
+        instances to match, so a post whose writes stopped right after a fold
+        is not shown with stale counts until the next write.
+        """
+        sharded = {post.pk: post for post in posts if post.sharded_counters}
+        if not sharded:
+            return
+        pending = cls.objects.filter(post_id__in=sharded).exclude(value=0).values_list('post_id', flat=True).distinct()
+        for post_id in [post_id for post_id in pending if cls.may_fold(post_id)]:
+            totals = cls.fold(post_id)
+            if totals:
+                post = sharded[post_id]
+                for field, total in totals.items():
+                    setattr(post, field, max(0, getattr(post, field) + total))
+                post.cache_version += 1
+
+    @classmethod
+    def fold(cls, post_id):
+        """Move the unfolded slot totals of one post into its columns; returns {field: total moved}."""
+        with transaction.atomic():
+            shards = list(cls.objects.filter(post_id=post_id).exclude(value=0).values_list('id', 'field', 'value'))
+            if not shards:
+                return Counter()
+            totals = Counter()
+            for shard_id, field, value in shards:
+                # Subtract exactly what was read, so deltas added meanwhile survive
+                cls.objects.filter(pk=shard_id).update(value=F('value') - value)
+                totals[field] += value
+            Post.objects.filter(pk=post_id).update(
+                cache_version=F('cache_version') + 1,
+                **{field: clamped_add(field, total) for field, total in totals.items()},
+            )
+        return totals
+
+    @classmethod
+    def fold_all(cls):
+        post_ids = cls.objects.exclude(value=0).values_list('post_id', flat=True).distinct()
+        for post_id in list(post_ids):
+            cls.fold(post_id)
+
+
+class TrendingScore(models.Model):
+    """
+    Exponentially decayed activity score of a design on one trending board.
+    Scores are kept relative to the start of their era (see api/trending.py),
+    so an event only ever adds to a score and rows never need rewriting as
+    time passes.
+    """
+    board = models.CharField(max_length=20)  # e.g. 'liked'
+    design = models.ForeignKey('Design', on_delete=models.CASCADE, related_name='trending_scores')
+    era = models.IntegerField()
+    score = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('board', 'design')
+        indexes = [
+            models.Index(fields=['board', 'era', '-score'], name='trending_board_era_score_idx'),
+        ]
+
+
+class CartAddBucket(models.Model):
+    """
+    Cart additions of one design within one hour. Each design has at most
+    RING_HOURS rows: the bucket for an hour reuses slot hour % RING_HOURS,
+    overwriting whatever older hour was there (see api/cart_activity.py).
+    """
+    design = models.ForeignKey('Design', on_delete=models.CASCADE, related_name='cart_add_buckets')
+    slot = models.PositiveSmallIntegerField()
+    hour = models.IntegerField()  # Hours since the Unix epoch
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('design', 'slot')
+        indexes = [
+            models.Index(fields=['hour'], name='cart_bucket_hour_idx'),
+        ]
+
+
+class LeaderboardTotal(models.Model):
+    """
+    A user's running total of one leaderboard metric within one period of a
+    window (see api/leaderboards.py). A new week or month simply starts new
+    rows, so windows roll over without recomputing anything.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='leaderboard_totals')
+    metric = models.CharField(max_length=10)  # 'likes' or 'posts'
+    window = models.CharField(max_length=10)  # 'all', 'week' or 'month'
+    period = models.IntegerField()  # 0 for 'all', else e.g. 202542 (ISO week) or 202510
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'metric', 'window', 'period')
+        indexes = [
+            models.Index(fields=['metric', 'window', 'period', '-total'], name='leaderboard_rank_idx'),
+        ]
+
+
+class SearchPosting(models.Model):
+    """
+    One row of the post search index: ``term`` appears in ``post`` with a
+    field-weighted frequency of ``weight``. Rebuilt by api.search_index.
+    """
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='search_postings')
+    weight = models.PositiveIntegerField()
+    doc_length = models.PositiveIntegerField()  # copied from SearchDocument so ranking needs no join
+
+    class Meta:
+        unique_together = ('term', 'post')
+
+
+class SearchDocument(models.Model):
+    """Indexed length of each post; gives BM25 its corpus size and average length."""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    length = models.PositiveIntegerField(default=0)
+
+
+class EngagementIntent(models.Model):
+    """
+    A like/favorite change recorded in write-behind mode (ENGAGEMENT_WRITE_BEHIND)
+    and not yet applied. ``active`` is the state the user asked for; the
+    flush_engagement command applies the latest intent per (user, post, kind).
+    """
+    KINDS = [
+        ('like', 'Like'),
+        ('favorite', 'Favorite'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    active = models.BooleanField()  # True = liked / favorited
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'post', 'kind', '-id'], name='intent_user_post_kind_idx'),
+        ]
+
+
+class EngagementEvent(models.Model):
+    """
+    A committed like/favorite change whose counter_adjusted side effects
+    (trending, leaderboards) have not been applied yet. Only written with
+    ENGAGEMENT_EVENTS_WORKER, in the transaction that changes the row;
+    apply_events in api/engagement.py (run by flush_engagement) works through
+    them in batches, outside the toggles' transactions.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=EngagementIntent.KINDS)
+    delta = models.SmallIntegerField()  # +1 added, -1 removed
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
 # Create your models here.
@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import Notification
+
+
+# Likes and favorites of a design merge into the owner's latest unread
+# notification of that kind for the design, if it was touched within
+# COALESCE_WINDOW: "alice and 41 others liked your design". The table grows
+# with distinct events instead of raw clicks, and the unread badge counts one
+# notification per design. Notifications are updated after the toggle commits
+# (api/engagement.py), so its transaction never locks a notification row.
+COALESCE_WINDOW = timedelta(hours=24)
+SAMPLE_ACTORS = 3
+VERBS = {'like': 'liked', 'favorite': 'favorited'}
+
+
+def render_message(kind, sample_actors, actor_count):
+    verb = VERBS[kind]
+    if not sample_actors:
+        return f"{actor_count} {'person' if actor_count == 1 else 'people'} {verb} your design"
+    if actor_count == 1:
+        return f"{sample_actors[0]} {verb} your design"
+    if actor_count == 2 and len(sample_actors) > 1:
+        return f"{sample_actors[0]} and {sample_actors[1]} {verb} your design"
+    others = actor_count - 1
+    return f"{sample_actors[0]} and {others} {'other' if others == 1 else 'others'} {verb} your design"
+
+
+def _open_notification(recipient_id, design_id, kind, since):
+    return Notification.objects.select_for_update().filter(
+        user_id=recipient_id, design_id=design_id, notification_type=kind, is_read=False, created_at__gte=since,
+    ).order_by('-created_at', '-id').first()
+
+
+def coalesce_engagement(recipient_id, design_id, kind, rows, actor_ids=()):
+    """
+    Bring the recipient's open ``kind`` notification for a design in line with
+    ``rows``, the design's current likes or favorites: actor_count is the
+    number of distinct users whose row is not older than the notification,
+    sample_actors the latest of them. ``actor_ids`` are users who just acted;
+    they resurface the notification, or open one. A notification nobody is
+    left in is deleted. Called once a like/favorite change has committed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        notification = _open_notification(recipient_id, design_id, kind, now - COALESCE_WINDOW)
+        if notification is None:
+            if not actor_ids:
+                return
+            opened_at = rows.filter(user_id__in=actor_ids).aggregate(first=Min('created_at'))['first']
+            if opened_at is None:
+                return  # Undone again since
+            notification = Notification(
+                user_id=recipient_id, design_id=design_id, notification_type=kind, opened_at=opened_at,
+            )
+
+        recent = rows.filter(created_at__gte=notification.opened_at or notification.created_at)
+        actor_count = recent.aggregate(actors=Count('user', distinct=True))['actors']
+        if not actor_count:
+            if notification.pk:
+                notification.delete()
+            return
+
+        # A user with rows on several posts of the design shows up once
+        latest = {}
+        for user_id, username in recent.order_by('-created_at', '-id').values_list('user_id', 'user__username')[:SAMPLE_ACTORS * 3]:
+            latest.setdefault(user_id, username)
+        notification.actor_count = actor_count
+        notification.sample_actors = list(latest.values())[:SAMPLE_ACTORS]
+        notification.action_user_id = next(iter(latest))
+        notification.message = render_message(kind, notification.sample_actors, actor_count)
+        if actor_ids:
+            notification.created_at = now  # Resurfaces at the top of the list
+        notification.save()
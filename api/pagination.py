@@ -0,0 +1,84 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def is_cursor_request(request):
+    """Return True when the client asked for a keyset-paginated page."""
+    params = request.query_params
+    return 'cursor' in params or 'page_size' in params
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE):
+    """Read ?page_size= and clamp it to [1, MAX_PAGE_SIZE]."""
+    try:
+        page_size = int(request.query_params.get('page_size', default))
+    except (TypeError, ValueError):
+        raise ParseError('Invalid page_size.')
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(value, pk):
+    """Pack an (ordering value, id) pair into an opaque url-safe token."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, parse_value=datetime.fromisoformat):
+    """Inverse of encode_cursor. Raises ParseError on a malformed token."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return parse_value(value), int(pk)
+    except (TypeError, ValueError, binascii.Error):
+        raise ParseError('Invalid cursor.')
+
+
+def keyset_page(queryset, request, field='created_at', pk_field='id'):
+    """
+    Return one page of ``queryset`` ordered newest first on (field, id),
+    plus the cursor for the next page (None on the last page).
+
+    The page is located with a range predicate on the composite key instead of
+    OFFSET, so every page costs the same regardless of how deep the client has
+    scrolled.
+    """
+    page_size = get_page_size(request)
+    rows = list(keyset_filter(queryset, request, field, pk_field)[:page_size + 1])
+    page = rows[:page_size]
+
+    next_cursor = None
+    if len(rows) > page_size:
+        last = page[-1]
+        next_cursor = encode_cursor(_resolve(last, field), _resolve(last, pk_field))
+    return page, next_cursor
+
+
+def keyset_filter(queryset, request, field='created_at', pk_field='id'):
+    """``queryset`` ordered as keyset_page orders it, starting after ?cursor= (unsliced)."""
+    queryset = queryset.order_by(f'-{field}', f'-{pk_field}')
+
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{field}__lt': value}) |
+            Q(**{field: value, f'{pk_field}__lt': pk})
+        )
+    return queryset
+
+
+def _resolve(obj, path):
+    for attr in path.split('__'):
+        obj = getattr(obj, attr)
+    return obj
@@ -0,0 +1,161 @@
+import re
+
+import numpy as np
+
+from .vector_store import VectorStore
+
+
+# Each design's three classifier colours in CIELAB plus their squared norms:
+#   [L1 a1 b1 L2 a2 b2 L3 a3 b3 |c1|^2 |c2|^2 |c3|^2]
+# so squared distances to a query come out of one matrix product,
+# |c - q|^2 = |c|^2 - 2 c.q + |q|^2. A colour that could not be parsed is
+# stored as zeros with a huge norm, which puts it far from everything.
+STORE = VectorStore('design_palettes', 12)
+MISSING_NORM = 1e6
+
+# Extra distance (in delta-E units) for matching a design's 2nd / 3rd colour
+# rather than its dominant one
+RANK_PENALTY = np.array([0.0, 6.0, 12.0], dtype=np.float32)
+
+HEX_RE = re.compile(r'^#?([0-9a-f]{6}|[0-9a-f]{3})$')
+RGB_RE = re.compile(r'^(?:rgb)?\(?\s*(\d{1,3})\s*,\s*(\d{1,3})\s*,\s*(\d{1,3})\s*\)?$')
+
+# sRGB (D65) -> XYZ
+RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+def parse_colour(value):
+    """Return (r, g, b) in 0..255 for '#rrggbb', '#rgb' or 'rgb(r, g, b)', else None."""
+    if not value:
+        return None
+    value = value.strip().lower()
+    match = HEX_RE.match(value)
+    if match:
+        digits = match.group(1)
+        if len(digits) == 3:
+            digits = ''.join(ch * 2 for ch in digits)
+        return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4))
+    match = RGB_RE.match(value)
+    if match:
+        rgb = tuple(int(part) for part in match.groups())
+        if all(part <= 255 for part in rgb):
+            return rgb
+    return None
+
+
+def rgb_to_lab(rgb):
+    """Convert an (..., 3) array of 0..255 sRGB values to CIELAB."""
+    srgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(srgb > 0.04045, ((srgb + 0.055) / 1.055) ** 2.4, srgb / 12.92)
+    xyz = linear @ RGB_TO_XYZ.T / WHITE
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    lab = np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+    return lab.astype(np.float32)
+
+
+def design_palette(design):
+    """(3, 3) Lab palette of a design with NaN rows for missing colours, or None if it has none."""
+    colours = [parse_colour(c) for c in (design.color1, design.color2, design.color3)]
+    if not any(colours):
+        return None
+    palette = np.full((3, 3), np.nan, dtype=np.float32)
+    for i, rgb in enumerate(colours):
+        if rgb is not None:
+            palette[i] = rgb_to_lab(rgb)
+    return palette
+
+
+def palette_vector(palette):
+    missing = np.isnan(palette).any(axis=1)
+    colours = np.where(missing[:, None], 0, palette)
+    norms = np.where(missing, MISSING_NORM, (colours ** 2).sum(axis=1))
+    return np.concatenate([colours.ravel(), norms]).astype(np.float32)
+
+
+def index_design(design):
+    palette = design_palette(design)
+    if palette is None:
+        STORE.remove(design.id)
+    else:
+        STORE.upsert(design.id, palette_vector(palette))
+
+
+def unindex_design(design_id):
+    STORE.remove(design_id)
+
+
+def _squared_distances(vectors, query):
+    """
+    Three (n, m) arrays: squared delta-E from each stored colour slot to each
+    of the m ``query`` colours, from a single (n, 12) x (12, 3m) product.
+    """
+    m = len(query)
+    weights = np.zeros((12, 3 * m), dtype=np.float32)
+    for slot in range(3):
+        columns = slice(slot * m, (slot + 1) * m)
+        weights[3 * slot:3 * slot + 3, columns] = -2 * query.T
+        weights[9 + slot, columns] = 1
+    squared = np.asarray(vectors) @ weights + np.tile((query ** 2).sum(axis=1), 3)
+    return [squared[:, slot * m:(slot + 1) * m] for slot in range(3)]
+
+
+def _top_k(ids, distances, k, exclude=None):
+    distances = np.where(ids == 0, np.inf, distances)
+    if exclude is not None:
+        distances[ids == exclude] = np.inf
+    k = min(k, int(np.isfinite(distances).sum()))
+    if k == 0:
+        return []
+    best = np.argpartition(distances, k - 1)[:k]
+    best = best[np.argsort(distances[best], kind='stable')]
+    return [(int(ids[i]), float(distances[i])) for i in best]
+
+
+def nearest_to_colour(rgb, k=20):
+    """
+    [(design_id, delta-E)] of the k designs with a colour closest to ``rgb``.
+    Matching the dominant colour beats matching the 2nd or 3rd one.
+    """
+    ids, vectors = STORE.arrays()
+    if not len(ids):
+        return []
+    target = rgb_to_lab(rgb).reshape(1, 3)
+    # Slices and np.minimum rather than .min(axis=1): reducing over a length-3 axis is slow
+    first, second, third = (np.sqrt(np.maximum(d[:, 0], 0)) for d in _squared_distances(vectors, target))
+    distances = np.minimum(np.minimum(first, second + RANK_PENALTY[1]), third + RANK_PENALTY[2])
+    return _top_k(ids, distances, k)
+
+
+def nearest_to_palette(palette, k=20, exclude=None):
+    """
+    [(design_id, distance)] of the k designs whose palettes are closest to
+    ``palette``: for each colour of ``palette``, the delta-E to the nearest
+    colour of the candidate, averaged.
+    """
+    ids, vectors = STORE.arrays()
+    if not len(ids):
+        return []
+    query = palette[~np.isnan(palette).any(axis=1)]
+    first, second, third = _squared_distances(vectors, query)
+    nearest = np.sqrt(np.maximum(np.minimum(np.minimum(first, second), third), 0))
+    distances = nearest.sum(axis=1) / len(query)
+    return _top_k(ids, distances, k, exclude=exclude)
+
+
+def rebuild(designs):
+    """Replace the index with the palettes of ``designs``; returns how many were indexed."""
+    rows = []
+    for design in designs:
+        palette = design_palette(design)
+        if palette is not None:
+            rows.append((design.id, palette_vector(palette)))
+    return STORE.rebuild(rows)
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from .models import CustomUser
+from .serializers import NotificationSerializer
+
+
+# Server push of notifications. Each open stream subscribes a queue to the
+# process-wide Hub; publish() hands events to the configured backend
+# (settings.PUSH_BACKEND), which delivers them to the Hub of every worker
+# that may hold a stream for the user.
+
+# Events buffered per stream; a client that falls this far behind misses events
+QUEUE_SIZE = 100
+RECONNECT_DELAY = 1
+# Streams refresh their presence at every keep-alive; one not refreshed for
+# this long (its worker died) no longer counts as connected
+PRESENCE_TTL = 45
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+class Hub:
+    """The streams open in this process, by user id."""
+
+    def __init__(self):
+        self._streams = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """A queue that receives the user's events; call from the stream's event loop."""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._streams[user_id].add((asyncio.get_running_loop(), queue))
+        get_backend().listen(self)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            streams = self._streams.get(user_id, set())
+            streams.difference_update({stream for stream in streams if stream[1] is queue})
+            if not streams:
+                self._streams.pop(user_id, None)
+
+    def has_streams(self, user_id):
+        return user_id in self._streams
+
+    def dispatch(self, user_id, event):
+        """Queue ``event`` on each of the user's streams; safe from any thread."""
+        with self._lock:
+            streams = list(self._streams.get(user_id, ()))
+        for loop, queue in streams:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+hub = Hub()
+
+
+class LocalBackend:
+    """Delivers within this process only: for a single worker, and for tests."""
+
+    def listen(self, hub):
+        pass
+
+    def connected(self, user_id, stream_id):
+        pass
+
+    def disconnected(self, user_id, stream_id):
+        pass
+
+    def may_reach(self, user_id):
+        return hub.has_streams(user_id)
+
+    def publish(self, user_id, event):
+        hub.dispatch(user_id, event)
+
+
+class RedisBackend:
+    """
+    Delivers through one Redis pub/sub channel that every worker listens to
+    from a background thread (requires the redis package and REDIS_URL).
+    """
+    CHANNEL = 'push:events'
+
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(settings.REDIS_URL)
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def listen(self, hub):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._run, args=(hub,), name='push-listener', daemon=True)
+                self._listener.start()
+
+    def _run(self, hub):
+        import redis
+
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    hub.dispatch(payload['user_id'], payload['event'])
+            except redis.ConnectionError as e:
+                # Events published while disconnected are lost; clients catch up on reconnect
+                print(f"Push listener lost Redis: {e}")
+                time.sleep(RECONNECT_DELAY)
+
+    # Presence: a sorted set per user of the open stream ids, scored by when
+    # each stops counting unless refreshed. Lets publishers skip the users
+    # nobody is streaming to, which is almost all of them.
+    def _presence_key(self, user_id):
+        return f'push:presence:{user_id}'
+
+    def connected(self, user_id, stream_id):
+        key = self._presence_key(user_id)
+        pipe = self.client.pipeline()
+        pipe.zadd(key, {stream_id: time.time() + PRESENCE_TTL})
+        pipe.expire(key, PRESENCE_TTL)
+        pipe.execute()
+
+    def disconnected(self, user_id, stream_id):
+        self.client.zrem(self._presence_key(user_id), stream_id)
+
+    def may_reach(self, user_id):
+        import redis
+
+        try:
+            return self.client.zcount(self._presence_key(user_id), time.time(), '+inf') > 0
+        except redis.RedisError as e:
+            print(f"Error reading push presence of user {user_id}: {e}")
+            return True
+
+    def publish(self, user_id, event):
+        self.client.publish(self.CHANNEL, json.dumps({'user_id': user_id, 'event': event}, cls=DjangoJSONEncoder))
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.PUSH_BACKEND)()
+    return _backend
+
+
+def new_stream_id():
+    return uuid.uuid4().hex
+
+
+def connected(user_id, stream_id):
+    """Mark a stream as open; call on connect and at every keep-alive."""
+    try:
+        get_backend().connected(user_id, stream_id)
+    except Exception as e:
+        print(f"Error recording push presence of user {user_id}: {e}")
+
+
+def disconnected(user_id, stream_id):
+    try:
+        get_backend().disconnected(user_id, stream_id)
+    except Exception as e:
+        print(f"Error clearing push presence of user {user_id}: {e}")
+
+
+def publish(user_id, event):
+    try:
+        get_backend().publish(user_id, event)
+    except Exception as e:
+        # Delivery is best effort; the notification itself is already stored
+        print(f"Error pushing to user {user_id}: {e}")
+
+
+def _unread_count(user_id):
+    return CustomUser.objects.filter(pk=user_id).values_list('unread_notifications', flat=True).first() or 0
+
+
+def push_notification(notification):
+    """Push a new or updated (coalesced) notification with the recipient's unread count."""
+    if not get_backend().may_reach(notification.user_id):
+        return
+    publish(notification.user_id, {
+        'type': 'notification',
+        'notification': NotificationSerializer(notification).data,
+        'unread_count': _unread_count(notification.user_id),
+    })
+
+
+def push_unread_count(user_id):
+    if get_backend().may_reach(user_id):
+        publish(user_id, {'type': 'unread_count', 'unread_count': _unread_count(user_id)})
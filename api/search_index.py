@@ -0,0 +1,216 @@
+import math
+import re
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+
+from .models import Post, SearchDocument, SearchPosting
+from .pagination import decode_cursor, encode_cursor
+
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+# Caption and hashtags say more about a post than its long description
+FIELD_WEIGHTS = {
+    'caption': 2,
+    'hashtags': 2,
+    'description': 1,
+    'modell': 1,
+    'type': 1,
+    'theclass': 1,
+    'sku': 1,
+}
+
+MAX_TERM_LENGTH = 64
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Lowercased word tokens of ``text``."""
+    if not text:
+        return []
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text.lower())]
+
+
+def post_fields(post):
+    design = post.design
+    return {
+        'caption': post.caption,
+        'description': post.description,
+        'hashtags': ' '.join(hashtag.name for hashtag in post.hashtags.all()),
+        'modell': design.modell,
+        'type': design.type,
+        'theclass': design.theclass,
+        'sku': design.sku,
+    }
+
+
+# Corpus size and total indexed length, kept in the cache and adjusted as
+# posts are (re)indexed so a search needs no aggregate over SearchDocument.
+# They expire now and then and are recounted, which also undoes drift.
+STATS_KEYS = ('search:documents', 'search:total-length')
+STATS_TTL = 3600
+
+# A last term shorter than this matches exactly instead of as a prefix, and
+# a prefix stands for at most MAX_PREFIX_TERMS indexed terms
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_TERMS = 50
+
+
+def corpus_stats():
+    """(number of indexed posts, their total length)."""
+    cached = cache.get_many(STATS_KEYS)
+    if len(cached) == len(STATS_KEYS):
+        return tuple(cached[key] for key in STATS_KEYS)
+    stats = SearchDocument.objects.aggregate(documents=Count('post'), length=Sum('length'))
+    values = (stats['documents'], stats['length'] or 0)
+    cache.set_many(dict(zip(STATS_KEYS, values)), timeout=STATS_TTL)
+    return values
+
+
+def adjust_stats(documents, length):
+    """Move the cached corpus stats by a committed index change."""
+    for key, delta in zip(STATS_KEYS, (documents, length)):
+        if delta:
+            try:
+                cache.incr(key, delta)
+            except ValueError:
+                # Not cached: the next search recounts
+                pass
+
+
+def index_post(post):
+    """(Re)build the postings of one post. Deleting a post drops its postings by cascade."""
+    weights = Counter()
+    for field, text in post_fields(post).items():
+        for term in tokenize(text):
+            weights[term] += FIELD_WEIGHTS[field]
+    length = sum(weights.values())
+
+    with transaction.atomic():
+        previous = SearchDocument.objects.filter(post=post).values_list('length', flat=True).first()
+        SearchPosting.objects.filter(post=post).delete()
+        SearchPosting.objects.bulk_create([
+            SearchPosting(term=term, post=post, weight=weight, doc_length=length)
+            for term, weight in weights.items()
+        ])
+        SearchDocument.objects.update_or_create(post=post, defaults={'length': length})
+        transaction.on_commit(lambda: adjust_stats(int(previous is None), length - (previous or 0)))
+
+
+class _PendingIndex:
+    """on_commit callback that reindexes every post scheduled in its transaction."""
+
+    def __init__(self):
+        self.post_ids = set()
+
+    def __call__(self):
+        posts = Post.objects.filter(id__in=self.post_ids).select_related('design').prefetch_related('hashtags')
+        for post in posts:
+            index_post(post)
+
+
+def schedule_index(post_id):
+    """
+    Reindex a post once the current transaction commits (at once outside
+    one). Saving a post and attaching its hashtags schedules it several
+    times; it is still indexed once.
+    """
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        # Join a pending reindex that commits whenever the current savepoint does
+        savepoints = set(connection.savepoint_ids)
+        for sids, callback, robust in connection.run_on_commit:
+            if isinstance(callback, _PendingIndex) and sids <= savepoints:
+                callback.post_ids.add(post_id)
+                return
+    pending = _PendingIndex()
+    pending.post_ids.add(post_id)
+    transaction.on_commit(pending)
+
+
+def _expand_terms(terms):
+    """{term: document frequency} for the query terms, the last one expanded as a prefix."""
+    *whole, partial = terms
+    if len(partial) < MIN_PREFIX_LENGTH:
+        whole.append(partial)
+        partial = None
+
+    frequencies = {}
+    grouped = SearchPosting.objects.order_by().values_list('term').annotate(df=Count('post'))
+    if whole:
+        frequencies.update(grouped.filter(term__in=whole))
+    if partial:
+        # Terms are stored lowercased, so a plain LIKE 'abc%' range-scans the term index
+        frequencies.update(grouped.filter(term__startswith=partial).order_by('term')[:MAX_PREFIX_TERMS])
+    return frequencies
+
+
+def search_posts(query, cursor=None, limit=20):
+    """
+    Rank posts for ``query`` with BM25 over the inverted index.
+
+    Every query term matches exactly, except the last one which matches as a
+    prefix (once it is MIN_PREFIX_LENGTH long) so results keep up while the
+    user is typing. Scoring, the cursor and the page limit all run in the
+    database. Returns (post ids for this page, next cursor or None); the
+    cursor carries the (score, id) of the last row so pages never overlap.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return [], None
+
+    frequencies = _expand_terms(terms)
+    if not frequencies:
+        return [], None
+
+    documents, total_length = corpus_stats()
+    documents = max(documents, 1)
+    avg_length = total_length / documents or 1
+
+    idf = Case(
+        *[
+            When(term=term, then=Value(math.log(1 + (documents - df + 0.5) / (df + 0.5))))
+            for term, df in frequencies.items()
+        ],
+        output_field=FloatField(),
+    )
+    norm = Value(K1 * (1 - B)) + Value(K1 * B / avg_length) * F('doc_length')
+    score = Sum(idf * F('weight') * Value(K1 + 1) / (F('weight') + norm), output_field=FloatField())
+    ranked = (
+        SearchPosting.objects.filter(term__in=frequencies)
+        .order_by().values('post_id').annotate(score=score)
+    )
+    if cursor:
+        last_score, last_id = decode_cursor(cursor, parse_value=float)
+        ranked = ranked.filter(Q(score__lt=last_score) | Q(score=last_score, post_id__lt=last_id))
+
+    rows = list(ranked.order_by('-score', '-post_id').values_list('post_id', 'score')[:limit + 1])
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        post_id, score = page[-1]
+        next_cursor = encode_cursor(score, post_id)
+    return [post_id for post_id, score in page], next_cursor
+
+
+def rebuild(chunk_size=500):
+    """Reindex every post; returns the number of posts indexed."""
+    indexed = 0
+    last_id = 0
+    while True:
+        posts = list(
+            Post.objects.filter(id__gt=last_id).order_by('id')
+            .select_related('design').prefetch_related('hashtags')[:chunk_size]
+        )
+        if not posts:
+            cache.delete_many(STATS_KEYS)
+            return indexed
+        for post in posts:
+            index_post(post)
+        indexed += len(posts)
+        last_id = posts[-1].id
@@ -2,11 +2,18 @@
 from rest_framework import serializers
 from .models import *
 from .models import CustomUser
+from .fragment_cache import VIEWER_FIELDS, fragment_variant, get_fragments, set_fragments
+from .loaders import get_loader
+from .engagement import COUNTERS, pending_states
+from django.conf import settings
 import os
 import cloudinary
 import cloudinary.uploader
 
-from django.db.models import Count, Sum
+from django.db import transaction
+from django.db.models import Count, Sum, F, Window, Prefetch, prefetch_related_objects
+from django.db.models.functions import RowNumber
+from django.db.models.manager import BaseManager
 from django.utils import timezone
 from datetime import datetime, timedelta
 
@@ -18,7 +25,94 @@ class ImageGenerationRequestSerializer(serializers.Serializer):
 
 from decimal import Decimal
 
-class DesignSerializer(serializers.ModelSerializer):
+
+def parse_field_list(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return {name.strip() for name in value if name and name.strip()}
+
+
+def get_sparse_fieldset(context):
+    """
+    Return (fields, exclude, include) requested through the context or
+    ?fields= / ?exclude= / ?include=. ``fields`` is None when every field is
+    wanted. Query parameters are only honored on reads, so a stray ?fields=
+    can never drop writable fields.
+    """
+    keys = ('fields', 'exclude', 'include')
+    if any(key in context for key in keys):
+        values = [context.get(key) for key in keys]
+    else:
+        request = context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None, set(), set()
+        query_params = getattr(request, 'query_params', request.GET)
+        values = [query_params.get(key) for key in keys]
+    only, exclude, include = (parse_field_list(value) for value in values)
+    return only, exclude or set(), include or set()
+
+
+class SparseFieldsetMixin:
+    """
+    Trims readable fields to ?fields=a,b minus ?exclude=c. Fields listed in
+    Meta.optional_fields are expensive and only rendered when named in
+    ?include= or ?fields=. Dropped fields are removed before serialization,
+    so their sources and get_<field> methods never run.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        only, exclude, include = get_sparse_fieldset(self.context)
+        optional = set(getattr(self.Meta, 'optional_fields', ()))
+        if only is None and not exclude and not optional:
+            return
+        for name, field in list(self.fields.items()):
+            if field.write_only:
+                continue
+            if name in optional and name not in include and (only is None or name not in only):
+                self.fields.pop(name)
+            elif (only is not None and name not in only) or name in exclude:
+                self.fields.pop(name)
+
+
+class BatchLoadingListSerializer(serializers.ListSerializer):
+    """
+    Loads the relations the child's selected fields read (child.FIELD_RELATIONS)
+    through the request's DataLoader, one IN query per related model, before
+    the rows are serialized. Views don't need select_related to avoid N+1.
+    """
+
+    def get_relations(self):
+        fields = self.child.fields
+        return sorted({
+            relation for name, relation in self.child.FIELD_RELATIONS.items() if name in fields
+        })
+
+    def to_representation(self, data):
+        if isinstance(data, BaseManager):
+            data = data.all()
+        instances = list(data)
+        get_loader(self.context).load(instances, *self.get_relations())
+        return super().to_representation(instances)
+
+
+class DesignListSerializer(BatchLoadingListSerializer):
+    """Applies DesignSerializer's prefetch plan to the whole list in one pass."""
+
+    def to_representation(self, data):
+        if isinstance(data, BaseManager):
+            data = data.all()
+        designs = list(data)
+        get_loader(self.context).load(designs, *self.get_relations())
+        prefetch_related_objects(designs, *DesignSerializer.get_prefetches(self.child.fields))
+        return super(BatchLoadingListSerializer, self).to_representation(designs)
+
+
+class DesignSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    FIELD_RELATIONS = {'user': 'user'}
+
     user = serializers.SerializerMethodField()
     is_anonymous = serializers.SerializerMethodField()
     posts = serializers.SerializerMethodField()
@@ -28,6 +122,20 @@ class DesignSerializer(serializers.ModelSerializer):
     class Meta:
         model = Design
         fields = ["id", "image_url", "user", "is_anonymous", "stock", "modell", "type", "sku", "price", "theclass", "posts", "color1", "color2", "color3", 'created_at']
+        # posts is a per-design summary, rendered only with ?include=posts
+        optional_fields = ["posts"]
+        list_serializer_class = DesignListSerializer
+
+    @staticmethod
+    def get_prefetches(fields):
+        """The prefetch plan for a list of designs rendering ``fields`` (the user comes from the DataLoader)."""
+        prefetches = []
+        if 'posts' in fields:
+            prefetches.append(Prefetch(
+                'posts',
+                queryset=Post.objects.only('id', 'design', 'like_count', 'comment_count', 'favorite_count').order_by('-created_at'),
+            ))
+        return prefetches
 
     def get_user(self, obj):
         """Handle both authenticated and anonymous designs"""
@@ -37,7 +145,7 @@ class DesignSerializer(serializers.ModelSerializer):
 
     def get_is_anonymous(self, obj):
         """Return whether the design is anonymous (has no user)"""
-        return obj.user is None
+        return obj.user_id is None
 
     def validate_price(self, value):
         """Ensure the price is non-negative."""   
@@ -46,14 +154,16 @@ class DesignSerializer(serializers.ModelSerializer):
         return value
 
     def get_posts(self, obj):
-        posts = obj.posts.all()
-        posts_data = PostSerializer(posts, many=True, context=self.context).data
-
-        # Update stock field in the post data to a string representation
-        for post_data in posts_data:
-            post_data['stock'] = "In Stock" if obj.stock else "Out of Stock"
-
-        return posts_data
+        """Return a flat summary of the design's posts (read from the prefetch cache in lists)"""
+        return [
+            {
+                'id': post.id,
+                'like_count': post.like_count,
+                'comment_count': post.comment_count,
+                'favorite_count': post.favorite_count,
+            }
+            for post in obj.posts.all()
+        ]
 
     def get_stock(self, obj):
         # Convert the stock field to a human-readable string for the design itself
@@ -62,9 +172,200 @@ class DesignSerializer(serializers.ModelSerializer):
 
 
 
+def get_viewer(context):
+    """Return the user viewer-specific fields are computed for (as_user or request.user), or None."""
+    user = context.get('as_user')
+    if not user:
+        request = context.get('request')
+        user = request.user if request and request.user.is_authenticated else None
+    if user and user.is_authenticated:
+        return user
+    return None
+
+
+def resolve_viewer_state(context, posts):
+    """
+    Load which of ``posts`` the viewer has liked and favorited, two queries per batch
+    (three in write-behind mode, which also records in ``offsets`` how far the
+    viewer's unapplied toggles will move each counter).
+
+    Results accumulate in ``context['viewer_state']`` so serializers that share a
+    context (e.g. a post plus its related posts) never look the same post up twice.
+    """
+    state = context.setdefault(
+        'viewer_state', {'resolved': set(), 'liked': set(), 'favorited': set(), 'offsets': {}}
+    )
+    pending = [post.id for post in posts if post.id not in state['resolved']]
+    if not pending:
+        return state
+
+    user = get_viewer(context)
+    if user is not None:
+        state['liked'].update(
+            Like.objects.filter(user=user, post_id__in=pending).values_list('post_id', flat=True)
+        )
+        state['favorited'].update(
+            Favorite.objects.filter(user=user, post_id__in=pending).values_list('post_id', flat=True)
+        )
+        if settings.ENGAGEMENT_WRITE_BEHIND:
+            # Show the viewer their own toggles before the flusher applies them
+            for (post_id, kind), active in pending_states(user.id, pending).items():
+                target = state['liked'] if kind == 'like' else state['favorited']
+                if active != (post_id in target):
+                    state['offsets'][(post_id, COUNTERS[kind])] = 1 if active else -1
+                if active:
+                    target.add(post_id)
+                else:
+                    target.discard(post_id)
+    state['resolved'].update(pending)
+    return state
+
+
+def needs_viewer_state(fields):
+    if 'is_liked' in fields or 'is_favorited' in fields:
+        return True
+    return settings.ENGAGEMENT_WRITE_BEHIND and any(field in fields for field in COUNTERS.values())
+
+
+def overlay_pending_counts(context, post, item):
+    """Move the counters in ``item`` by the viewer's own toggles the flusher has not applied yet."""
+    if not settings.ENGAGEMENT_WRITE_BEHIND:
+        return item
+    offsets = resolve_viewer_state(context, [post])['offsets']
+    for field in COUNTERS.values():
+        if field in item and (post.id, field) in offsets:
+            item[field] = max(0, item[field] + offsets[(post.id, field)])
+    return item
+
+
+MAX_COMMENTS_PREVIEW = 20
+
+
+def get_comments_preview(context):
+    """
+    Return N from ``comments_preview`` (context or ?comments_preview=), or None
+    when the caller wants every comment embedded.
+    """
+    value = context.get('comments_preview')
+    if value is None:
+        request = context.get('request')
+        query_params = getattr(request, 'query_params', None)
+        value = query_params.get('comments_preview') if query_params is not None else None
+    if value is None:
+        return None
+    try:
+        return max(0, min(int(value), MAX_COMMENTS_PREVIEW))
+    except (TypeError, ValueError):
+        return None
+
+
+def resolve_comment_previews(context, posts, limit):
+    """
+    Load the latest ``limit`` comments (every comment when ``limit`` is None) of
+    every post in ``posts`` with one query, authors joined. Results accumulate
+    in ``context['comment_previews']``.
+    """
+    previews = context.setdefault('comment_previews', {})
+    pending = [post.id for post in posts if post.id not in previews]
+    if not pending:
+        return previews
+
+    for post_id in pending:
+        previews[post_id] = []
+    if limit is None:
+        comments = list(Comment.objects.filter(post_id__in=pending).order_by('post_id', '-created_at', '-id'))
+    elif limit:
+        comments = list(Comment.objects.filter(post_id__in=pending).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=[F('post_id')],
+                order_by=[F('created_at').desc(), F('id').desc()],
+            )
+        ).filter(row_number__lte=limit).order_by('post_id', 'row_number'))
+    else:
+        comments = []
+    # Authors come through the request's DataLoader, shared with the posts' authors
+    get_loader(context).load(comments, 'user')
+    for comment in comments:
+        previews[comment.post_id].append(comment)
+    return previews
+
+
+class PostListSerializer(BatchLoadingListSerializer):
+    """Resolves viewer state (and comment previews) for the whole page before the rows are serialized."""
+
+    def to_representation(self, data):
+        if isinstance(data, BaseManager):
+            data = data.all()
+        fields = self.child.fields
+        posts = list(data)
+        PostCounterShard.fold_pending(posts)
+
+        if needs_viewer_state(fields):
+            resolve_viewer_state(self.context, posts)
+        if self.context.get('fragment_cache'):
+            return self.to_representation_cached(posts)
+
+        self.prepare(posts)
+        return super(BatchLoadingListSerializer, self).to_representation(posts)
+
+    def prepare(self, posts):
+        """Batch-load everything the selected fields read for ``posts``, and nothing else."""
+        fields = self.child.fields
+        get_loader(self.context).load(posts, *self.get_relations())
+        if 'hashtag_names' in fields:
+            get_loader(self.context).load(posts, 'hashtags')
+        if 'comments' in fields:
+            resolve_comment_previews(self.context, posts, get_comments_preview(self.context))
+
+    def to_representation_cached(self, posts):
+        """
+        Assemble the page from per-post fragments holding the viewer-independent
+        fields. Only posts without a fragment for their current cache_version are
+        serialized; is_liked/is_favorited (and in write-behind mode the
+        viewer's pending counts) are overlaid per request.
+        """
+        fields = self.child.fields
+        viewer_fields = [name for name in VIEWER_FIELDS if name in fields]
+        variant = fragment_variant(fields.keys(), get_comments_preview(self.context))
+
+        fragments = get_fragments(posts, variant)
+        misses = [post for post in posts if post.id not in fragments]
+        if misses:
+            self.prepare(misses)
+            fresh = {}
+            for post in misses:
+                fragment = self.child.to_representation(post)
+                for name in viewer_fields:
+                    fragment.pop(name, None)
+                fresh[post] = fragment
+                fragments[post.id] = fragment
+            set_fragments(fresh, variant)
+
+        state = self.context.get('viewer_state', {'liked': set(), 'favorited': set(), 'offsets': {}})
+        results = []
+        for post in posts:
+            item = dict(fragments[post.id])
+            if 'is_liked' in viewer_fields:
+                item['is_liked'] = post.id in state['liked']
+            if 'is_favorited' in viewer_fields:
+                item['is_favorited'] = post.id in state['favorited']
+            results.append(overlay_pending_counts(self.context, post, item))
+        return results
+
  
         
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # Relation each output field reads, batch-loaded by PostListSerializer for the selected fields
+    FIELD_RELATIONS = {
+        'user': 'user',
+        'user_id': 'user',
+        'first_name': 'user',
+        'profile_pic': 'user',
+        'user_details': 'user',
+        'design': 'design',
+    }
+
     user = serializers.CharField(source='user.username', read_only=True)
     user_id = serializers.IntegerField(source='user.id', read_only=True)
     first_name = serializers.CharField(source='user.first_name', read_only=True)
@@ -81,9 +382,9 @@ class PostSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
 
     design = serializers.SerializerMethodField()
-    like_count = serializers.IntegerField(source='likes.count', read_only=True)
-    comment_count = serializers.IntegerField(source='comments.count', read_only=True)
-    favorite_count = serializers.IntegerField(source='favorites.count', read_only=True)
+    like_count = serializers.IntegerField(read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+    favorite_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Post
@@ -93,6 +394,7 @@ class PostSerializer(serializers.ModelSerializer):
             'first_name', 'profile_pic', 'hashtags', 'hashtag_names',
             'user_details', 'comments', 'is_liked', 'is_favorited'
         ]
+        list_serializer_class = PostListSerializer
 
     def get_hashtag_names(self, obj):
         """Return hashtag names for read operations"""
@@ -117,39 +419,32 @@ class PostSerializer(serializers.ModelSerializer):
         return None
 
     def get_comments(self, obj):
-        """Return all comments on the post"""
-        comments = obj.comments.all().order_by('-created_at')
-        return CommentSerializer(comments, many=True).data
+        """Return the comments on the post: the latest N in comments_preview mode, otherwise all of them"""
+        comments = resolve_comment_previews(self.context, [obj], get_comments_preview(self.context))[obj.id]
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.context.get('fragment_cache'):
+            # Shared fragment; PostListSerializer overlays the viewer's counts
+            return data
+        return overlay_pending_counts(self.context, instance, data)
 
     def get_is_liked(self, obj):
         """Check if the context user (as_user or request.user) has liked this post"""
-        user = self.context.get('as_user')
-        if not user:
-            request = self.context.get('request')
-            user = request.user if request and request.user.is_authenticated else None
-        if user and user.is_authenticated:
-            return obj.likes.filter(user=user).exists()
-        return False
+        return obj.id in resolve_viewer_state(self.context, [obj])['liked']
 
     def get_is_favorited(self, obj):
         """Check if the context user (as_user or request.user) has favorited this post"""
-        user = self.context.get('as_user')
-        if not user:
-            request = self.context.get('request')
-            user = request.user if request and request.user.is_authenticated else None
-        if user and user.is_authenticated:
-            return obj.favorites.filter(user=user).exists()
-        return False
+        return obj.id in resolve_viewer_state(self.context, [obj])['favorited']
 
     def create(self, validated_data):
         hashtags_data = validated_data.pop('hashtags', [])
-        post = Post.objects.create(**validated_data)
-        
-        # Process hashtags (limit to 5)
-        for tag in hashtags_data[:5]:
-            if tag and len(tag.strip()) > 0:
-                hashtag_obj, created = Hashtag.objects.get_or_create(name=tag.strip())
-                post.hashtags.add(hashtag_obj)
+        with transaction.atomic():
+            post = Post.objects.create(**validated_data)
+
+            # Process hashtags (limit to 5)
+            post.add_hashtags(hashtags_data)
         
         return post
 
@@ -220,6 +515,12 @@ class OrderSerializer(serializers.ModelSerializer):
 
 
 class NotificationSerializer(serializers.ModelSerializer):
+    FIELD_RELATIONS = {
+        'action_user': 'action_user',
+        'action_user_profile_pic': 'action_user',
+        'design_image_url': 'design',
+    }
+
     action_user = serializers.CharField(source='action_user.username', read_only=True)
     action_user_profile_pic = serializers.CharField(source='action_user.profile_pic', read_only=True)
     design_image_url = serializers.CharField(source='design.image_url', read_only=True)
@@ -227,7 +528,8 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
-        fields = ['id', 'message', 'notification_type', 'created_at', 'relative_time', 'is_read', 'action_user', 'action_user_profile_pic', 'design_image_url']
+        fields = ['id', 'message', 'notification_type', 'created_at', 'relative_time', 'is_read', 'action_user', 'action_user_profile_pic', 'design_image_url', 'actor_count', 'sample_actors']
+        list_serializer_class = BatchLoadingListSerializer
 
     def get_relative_time(self, obj):
         """Return relative time like '1 day ago', '2 hours ago', etc."""
@@ -257,12 +559,15 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 
 class ChartSerializer(serializers.ModelSerializer):
+    FIELD_RELATIONS = {'user': 'user', 'design': 'design'}
+
     user = serializers.CharField(source='user.username', read_only=True)
     design = serializers.SerializerMethodField()
 
     class Meta:
         model = Chart
         fields = ['id', 'design', 'added_at', 'user', 'price']  # Include the price field
+        list_serializer_class = BatchLoadingListSerializer
 
     def get_design(self, obj):
         stock_status = "In Stock" if obj.design.stock else "Out of Stock"
@@ -280,7 +585,7 @@ class ChartSerializer(serializers.ModelSerializer):
 
 class LikeSerializer(serializers.ModelSerializer):
     # Include the like count (number of likes on the post) in the serializer
-    post_like_count = serializers.IntegerField(source='post.likes.count', read_only=True)
+    post_like_count = serializers.IntegerField(source='post.like_count', read_only=True)
 
     class Meta:
         model = Like
@@ -288,6 +593,8 @@ class LikeSerializer(serializers.ModelSerializer):
 
 
 class CommentSerializer(serializers.ModelSerializer):
+    FIELD_RELATIONS = {'user_id': 'user', 'username': 'user', 'profile_pic': 'user', 'first_name': 'user'}
+
     user_id = serializers.IntegerField(source='user.id')  # Get user ID
     username = serializers.CharField(source='user.username')  # Get username
     profile_pic = serializers.CharField(source='user.profile_pic')  # Get username
@@ -297,11 +604,12 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ['id', 'content', 'created_at', 'user_id', 'username',"profile_pic",'first_name']
+        list_serializer_class = BatchLoadingListSerializer
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
     # Include the favorite count (number of favorites on the post) in the serializer
-    post_favorite_count = serializers.IntegerField(source='post.favorites.count', read_only=True)
+    post_favorite_count = serializers.IntegerField(source='post.favorite_count', read_only=True)
 
     class Meta:
         model = Favorite
@@ -0,0 +1,181 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import (
+    Announcement, Chart, Comment, ContentVersion, CustomUser, Design, Favorite, Hashtag, Like, Notification,
+    PhoneProduct, Post, SearchDocument, counter_adjusted, received_likes_adjusted,
+)
+from . import cart_activity, design_embeddings, leaderboards, palette_index, push, suggest, trending
+from .conditional import bump_viewer
+from .engagement import pending_deltas
+from .search_index import adjust_stats, schedule_index
+
+
+# Everything a post feed item embeds: the post, its engagement rows and its
+# design. Bulk .update() calls bypass these and bump explicitly.
+POST_FEED_MODELS = (Post, Comment, Design)
+# The author / commenter fields feed items embed. Saves limited to other fields
+# (last_login on every token login, the denormalized counters) leave feeds alone.
+FEED_USER_FIELDS = {'username', 'email', 'first_name', 'last_name', 'profile_pic', 'status', 'is_staff'}
+
+
+@receiver([post_save, post_delete])
+def bump_content_versions(sender, instance=None, update_fields=None, **kwargs):
+    if sender is Design:
+        ContentVersion.bump('posts', 'designs')
+    elif sender in POST_FEED_MODELS:
+        ContentVersion.bump('posts')
+    elif sender in (Like, Favorite):
+        # Only the liker's is_liked/is_favorited changes (see api/conditional.py)
+        bump_viewer(instance.user_id)
+    elif sender is CustomUser:
+        if update_fields is None or FEED_USER_FIELDS & set(update_fields):
+            ContentVersion.bump('posts')
+    elif sender is Announcement:
+        ContentVersion.bump('announcements')
+    elif sender is PhoneProduct:
+        ContentVersion.bump('phone_products')
+
+
+# Keep the search index in step with what it covers, reindexing each post once
+# per transaction. Deleted posts lose their postings through the cascade.
+@receiver(post_save, sender=Post)
+def reindex_post(sender, instance, **kwargs):
+    schedule_index(instance.pk)
+
+
+@receiver(post_delete, sender=SearchDocument)
+def unindex_post(sender, instance, **kwargs):
+    length = instance.length
+    transaction.on_commit(lambda: adjust_stats(-1, -length))
+
+
+@receiver(pre_delete, sender=Post)
+def release_received_likes(sender, instance, **kwargs):
+    # The post's likes go with it by cascade, without going through adjust_counter.
+    # Runs inside the delete transaction; the instance's like_count may be stale.
+    # Likes whose EngagementEvent is still queued never reached the leaderboards,
+    # and the queued events go with the post too.
+    likes = Like.objects.filter(post=instance).count()
+    if likes:
+        CustomUser.adjust_received_likes(instance.user_id, -likes)
+    leaderboards.release_post(instance, pending_deltas(instance, 'like'))
+
+
+@receiver(m2m_changed, sender=Post.hashtags.through)
+def reindex_post_hashtags(sender, instance, action, pk_set=None, **kwargs):
+    if isinstance(instance, Post) and action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_index(instance.pk)
+        if action != 'post_clear' and pk_set:
+            suggest.bump_hashtags(pk_set, 1 if action == 'post_add' else -1)
+
+
+@receiver(post_save, sender=Design)
+def reindex_design_posts(sender, instance, created, **kwargs):
+    if not created:
+        for post_id in instance.posts.values_list('id', flat=True):
+            schedule_index(post_id)
+
+
+# Post fragments (api/fragment_cache.py) embed the design; retire them on edits
+@receiver(post_save, sender=Design)
+def retire_design_post_fragments(sender, instance, created, **kwargs):
+    if not created:
+        instance.posts.update(cache_version=F('cache_version') + 1)
+
+
+# Autocomplete entries; see api/suggest.py
+@receiver(post_save, sender=Hashtag)
+def suggest_hashtag_saved(sender, instance, **kwargs):
+    suggest.index_hashtag(instance)
+
+
+@receiver(post_delete, sender=Hashtag)
+def suggest_hashtag_deleted(sender, instance, **kwargs):
+    suggest.unindex_hashtag(instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+def suggest_user_saved(sender, instance, **kwargs):
+    suggest.index_user(instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def suggest_user_deleted(sender, instance, **kwargs):
+    suggest.unindex_user(instance.pk)
+
+
+@receiver(received_likes_adjusted, sender=CustomUser)
+def suggest_user_likes(sender, user_id, delta, **kwargs):
+    transaction.on_commit(lambda: suggest.bump_user(user_id, delta))
+
+
+# Colour palette and image embedding indexes; see api/palette_index.py and
+# api/design_embeddings.py (embeddings are queued where designs are classified)
+@receiver(post_save, sender=Design)
+def palette_design_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: palette_index.index_design(instance))
+
+
+@receiver(post_delete, sender=Design)
+def palette_design_deleted(sender, instance, **kwargs):
+    design_id = instance.pk
+    transaction.on_commit(lambda: palette_index.unindex_design(design_id))
+    transaction.on_commit(lambda: design_embeddings.unindex_design(design_id))
+
+
+# Trending boards; see api/trending.py. Scored after commit so a rolled-back
+# toggle never counts.
+@receiver(counter_adjusted, sender=Post)
+def record_trending_engagement(sender, post, field, delta, **kwargs):
+    design_id = post.design_id
+    transaction.on_commit(lambda: trending.record(field, design_id, delta))
+
+
+# Hourly cart-add buckets; see api/cart_activity.py
+@receiver(post_save, sender=Chart)
+def record_cart_add(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: cart_activity.record(instance.design_id))
+
+
+# User leaderboards; see api/leaderboards.py
+@receiver(counter_adjusted, sender=Post)
+def record_leaderboard_likes(sender, post, field, delta, **kwargs):
+    if field == 'like_count':
+        user_id = post.user_id
+        transaction.on_commit(lambda: leaderboards.add(user_id, 'likes', delta))
+
+
+@receiver(post_save, sender=Post)
+def record_leaderboard_post(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: leaderboards.add(instance.user_id, 'posts', 1, when=instance.created_at))
+
+
+# Unread badge counts. bulk_create and queryset .update() bypass these; their
+# callers adjust CustomUser.unread_notifications themselves.
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        CustomUser.adjust_unread_notifications(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_unread_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        CustomUser.adjust_unread_notifications(instance.user_id, -1)
+
+
+# Server push to open notification streams; see api/push.py
+@receiver(post_save, sender=Notification)
+def push_saved_notification(sender, instance, **kwargs):
+    transaction.on_commit(lambda: push.push_notification(instance))
+
+
+@receiver(post_delete, sender=Notification)
+def push_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        transaction.on_commit(lambda: push.push_unread_count(instance.user_id))
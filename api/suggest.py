@@ -0,0 +1,201 @@
+import bisect
+import heapq
+import threading
+import time
+
+from django.db import close_old_connections
+from django.db.models import Count
+
+from .models import CustomUser, Hashtag
+
+
+# Signals keep this process's indexes current (post counts, received likes,
+# renames); writes handled by other workers only arrive with the next rebuild.
+# Rebuilds run in a background thread while requests keep the old indexes.
+REFRESH_INTERVAL = 600
+MAX_SUGGESTIONS = 10
+# Prefixes this short match a large slice of the array; memoize their top-k
+MEMO_PREFIX_LENGTH = 2
+
+
+class PrefixIndex:
+    """
+    Lowercased names kept in a sorted array, so every name starting with a
+    prefix is one contiguous slice found with two bisects. Entries carry a
+    popularity score and the payload returned to the client.
+    """
+
+    def __init__(self, rows=()):
+        self._lock = threading.Lock()
+        self._entries = {}  # pk -> (key, score, payload)
+        self._memo = {}  # short prefix -> top MAX_SUGGESTIONS entries
+        for pk, name, score, payload in rows:
+            self._entries[pk] = (name.lower(), score, payload)
+        self._keys = sorted((key, pk) for pk, (key, score, payload) in self._entries.items())
+
+    def upsert(self, pk, name, payload, score=None):
+        key = name.lower()
+        with self._lock:
+            old = self._entries.get(pk)
+            if old is not None:
+                self._discard(pk, old[0])
+                if score is None:
+                    score = old[1]
+            self._entries[pk] = (key, score or 0, payload)
+            bisect.insort(self._keys, (key, pk))
+            self._forget(key)
+
+    def remove(self, pk):
+        with self._lock:
+            old = self._entries.pop(pk, None)
+            if old is not None:
+                self._discard(pk, old[0])
+                self._forget(old[0])
+
+    def bump(self, pk, delta):
+        with self._lock:
+            entry = self._entries.get(pk)
+            if entry is not None:
+                key, score, payload = entry
+                self._entries[pk] = (key, max(0, score + delta), payload)
+                self._forget(key)
+
+    def top(self, prefix, k=MAX_SUGGESTIONS):
+        """Return [(payload, score)] for the k most popular names starting with ``prefix``."""
+        prefix = prefix.lower()
+        memoize = len(prefix) <= MEMO_PREFIX_LENGTH
+        if memoize:
+            cached = self._memo.get(prefix)
+            if cached is not None:
+                return cached[:k]
+
+        with self._lock:
+            lo = bisect.bisect_left(self._keys, (prefix,))
+            hi = bisect.bisect_left(self._keys, (prefix + '\uffff',))
+            best = heapq.nsmallest(
+                max(k, MAX_SUGGESTIONS) if memoize else k,
+                self._keys[lo:hi],
+                key=lambda item: (-self._entries[item[1]][1], item[0]),
+            )
+            results = [(self._entries[pk][2], self._entries[pk][1]) for key, pk in best]
+            if memoize:
+                self._memo[prefix] = results
+        return results[:k]
+
+    def _discard(self, pk, key):
+        i = bisect.bisect_left(self._keys, (key, pk))
+        if i < len(self._keys) and self._keys[i] == (key, pk):
+            del self._keys[i]
+
+    def _forget(self, key):
+        for length in range(MEMO_PREFIX_LENGTH + 1):
+            self._memo.pop(key[:length], None)
+
+
+def user_payload(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'profile_pic': user.profile_pic,
+    }
+
+
+def build_hashtag_index():
+    hashtags = Hashtag.objects.annotate(post_count=Count('posthashtag'))
+    return PrefixIndex((h.id, h.name, h.post_count, {'name': h.name}) for h in hashtags)
+
+
+def build_user_index():
+    users = CustomUser.objects.filter(is_active=True).only(
+        'id', 'username', 'first_name', 'profile_pic', 'received_likes'
+    )
+    return PrefixIndex((u.id, u.username, u.received_likes, user_payload(u)) for u in users)
+
+
+_state = {'hashtags': None, 'users': None, 'built_at': 0.0, 'rebuilding': False}
+_build_lock = threading.Lock()
+
+
+def _build():
+    hashtags, users = build_hashtag_index(), build_user_index()
+    _state.update(hashtags=hashtags, users=users, built_at=time.monotonic())
+
+
+def _rebuild_in_background():
+    try:
+        _build()
+    except Exception as e:
+        # Keep serving the old indexes; the next request past the interval retries
+        print(f"Error rebuilding suggest indexes: {e}")
+    finally:
+        _state['rebuilding'] = False
+        close_old_connections()
+
+
+def get_indexes():
+    """
+    Return (hashtag index, user index). The first call builds them; after
+    REFRESH_INTERVAL the stale ones keep being served while a background
+    thread builds their replacements.
+    """
+    if _state['users'] is None:
+        with _build_lock:
+            if _state['users'] is None:
+                _build()
+    elif time.monotonic() - _state['built_at'] > REFRESH_INTERVAL:
+        with _build_lock:
+            start = not _state['rebuilding']
+            _state['rebuilding'] = True
+        if start:
+            threading.Thread(target=_rebuild_in_background, name='suggest-rebuild', daemon=True).start()
+    return _state['hashtags'], _state['users']
+
+
+def suggest(prefix, limit=MAX_SUGGESTIONS):
+    hashtags, users = get_indexes()
+    prefix = prefix.strip().lstrip('#@')
+    if not prefix:
+        return {'hashtags': [], 'users': []}
+    return {
+        'hashtags': [{**payload, 'post_count': score} for payload, score in hashtags.top(prefix, limit)],
+        'users': [{**payload, 'total_likes': score} for payload, score in users.top(prefix, limit)],
+    }
+
+
+# Incremental updates, called from signals. Until the first suggest() call in
+# this process there is nothing to update; the build reads fresh rows anyway.
+
+def index_hashtag(hashtag):
+    if _state['hashtags'] is not None:
+        _state['hashtags'].upsert(hashtag.id, hashtag.name, {'name': hashtag.name})
+
+
+def unindex_hashtag(pk):
+    if _state['hashtags'] is not None:
+        _state['hashtags'].remove(pk)
+
+
+def bump_hashtags(pks, delta):
+    if _state['hashtags'] is not None:
+        for pk in pks:
+            _state['hashtags'].bump(pk, delta)
+
+
+def index_user(user):
+    if _state['users'] is None:
+        return
+    if user.is_active:
+        _state['users'].upsert(user.id, user.username, user_payload(user))
+    else:
+        _state['users'].remove(user.id)
+
+
+def unindex_user(pk):
+    if _state['users'] is not None:
+        _state['users'].remove(pk)
+
+
+def bump_user(pk, delta):
+    if _state['users'] is not None:
+        _state['users'].bump(pk, delta)
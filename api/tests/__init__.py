@@ -0,0 +1,42 @@
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.models import CustomUser, Design, Post
+
+
+def make_user(username):
+    return CustomUser.objects.create_user(username=username, password='pw123456')
+
+
+def make_post(user, caption='', description='', sku='sku', **design_fields):
+    design = Design.objects.create(
+        image_url='https://example.com/design.png', user=user, stock=True,
+        modell=design_fields.pop('modell', 'iphone 14'), type=design_fields.pop('type', 'clear case'),
+        sku=sku, price=10, **design_fields,
+    )
+    return Post.objects.create(user=user, design=design, caption=caption, description=description)
+
+
+def client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+class APITestCase(TestCase):
+    """
+    Starts every test with an empty cache, and keeps the on-disk vector indexes
+    (written whenever a design is saved) in a temporary directory instead of
+    settings.VECTOR_INDEX_DIR.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        self.enterContext(override_settings(VECTOR_INDEX_DIR=index_dir.name))
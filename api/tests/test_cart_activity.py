@@ -0,0 +1,72 @@
+import time
+
+from django.core.cache import cache
+
+from api import cart_activity
+from api.models import CartAddBucket, Chart
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class CartActivityTests(APITestCase):
+    """Cart additions are summed from the hourly ring of CartAddBucket rows."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = make_user('author')
+        self.buyers = [make_user(f'buyer{i}') for i in range(3)]
+        self.posts = [make_post(self.author, caption=f'post {i}', sku=f'sku{i}') for i in range(3)]
+        self.now = time.time()
+
+    def add_to_cart(self, user, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            return client_for(user).post('/api/cart/add/', {'design_id': post.design_id})
+
+    def test_record_reuses_the_hour_bucket(self):
+        design_id = self.posts[0].design_id
+        cart_activity.record(design_id, now=self.now)
+        cart_activity.record(design_id, 2, now=self.now)
+        bucket = CartAddBucket.objects.get(design_id=design_id)
+        self.assertEqual(bucket.count, 3)
+
+    def test_a_slot_is_reset_when_the_ring_wraps(self):
+        design_id = self.posts[0].design_id
+        cart_activity.record(design_id, 5, now=self.now)
+        cart_activity.record(design_id, 1, now=self.now + cart_activity.RING_HOURS * 3600)
+        bucket = CartAddBucket.objects.get(design_id=design_id)
+        self.assertEqual(bucket.count, 1)
+
+    def test_top_only_sums_the_window(self):
+        first, second = self.posts[0].design_id, self.posts[1].design_id
+        cart_activity.record(first, 5, now=self.now - 30 * 3600)
+        cart_activity.record(first, 1, now=self.now)
+        cart_activity.record(second, 2, now=self.now)
+        self.assertEqual(cart_activity.top(24, now=self.now), [(second, 2), (first, 1)])
+        self.assertEqual(cart_activity.top(48, now=self.now), [(first, 6), (second, 2)])
+
+    def test_compact_and_rebuild(self):
+        design_id = self.posts[0].design_id
+        cart_activity.record(design_id, now=self.now - cart_activity.RING_HOURS * 3600)
+        self.assertEqual(cart_activity.compact(now=self.now), 1)
+
+        Chart.objects.create(user=self.buyers[0], design=self.posts[0].design, price=10)
+        Chart.objects.create(user=self.buyers[1], design=self.posts[0].design, price=10)
+        self.assertEqual(cart_activity.rebuild(), 1)
+        self.assertEqual(CartAddBucket.objects.get(design_id=design_id).count, 2)
+
+    def test_endpoint_ranks_designs_added_through_the_cart(self):
+        response = client_for().get('/api/posts/most-added-to-cart-designs/')
+        self.assertEqual(response.data, {'message': 'No designs added to cart yet'})
+
+        for buyer in self.buyers:
+            self.add_to_cart(buyer, self.posts[2])
+        self.add_to_cart(self.buyers[0], self.posts[1])
+        cache.clear()  # The empty ranking is cached for TOP_K_TTL
+
+        response = client_for().get('/api/posts/most-added-to-cart-designs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data], [self.posts[2].id, self.posts[1].id])
+
+    def test_endpoint_rejects_bad_hours(self):
+        response = client_for().get('/api/posts/most-added-to-cart-designs/', {'hours': 'week'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Announcement, ContentVersion, PostCounterShard
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user('author')
+        self.viewer = make_user('viewer')
+        self.other = make_user('other')
+        self.posts = [make_post(self.author, caption=f'post {i}', sku=f'sku{i}') for i in range(3)]
+
+    def get(self, url, etag=None, user=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with self.captureOnCommitCallbacks(execute=True):
+            return client_for(user or self.viewer).get(url, **headers)
+
+    def toggle(self, user, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            client_for(user).post(f'/api/posts/{post.id}/like/')
+
+    def test_unchanged_feed_is_a_304_without_running_the_view(self):
+        etag = self.get('/api/public-posts/')['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get('/api/public-posts/', etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertLessEqual(len(queries), 2)
+
+    def test_counter_changes_on_the_page_move_the_etag(self):
+        for url in ('/api/public-posts/', '/recent-posts/'):
+            with self.subTest(url=url):
+                etag = self.get(url)['ETag']
+                self.toggle(self.other, self.posts[0])
+                response = self.get(url, etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_counter_changes_off_the_page_keep_the_etag(self):
+        # The newest post alone; posts[0] is on a later page
+        etag = self.get('/api/public-posts/?page_size=1')['ETag']
+        self.toggle(self.other, self.posts[0])
+        self.assertEqual(self.get('/api/public-posts/?page_size=1', etag).status_code, 304)
+
+    def test_sharded_deltas_move_the_etag(self):
+        post = self.posts[2]
+        PostCounterShard.promote(post)
+        etag = self.get('/api/public-posts/?page_size=1')['ETag']
+        # Use up the fold interval so the like stays in a shard
+        PostCounterShard.may_fold(post.id)
+        self.toggle(self.other, post)
+        self.assertTrue(PostCounterShard.objects.filter(post=post).exclude(value=0).exists())
+
+        cache.delete(f'counter-fold:{post.id}')  # The interval has passed
+        response = self.get('/api/public-posts/?page_size=1', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['like_count'], 1)
+
+    def test_viewer_version_is_per_user(self):
+        etag = self.get('/api/public-posts/?page_size=1')['ETag']
+        other_etag = self.get('/api/public-posts/?page_size=1', user=self.other)['ETag']
+        self.assertNotEqual(etag, other_etag)
+
+        # The viewer likes a post that is not on the page: only their is_liked could change
+        self.toggle(self.viewer, self.posts[0])
+        self.assertEqual(ContentVersion.current(f'viewer:{self.viewer.pk}')[f'viewer:{self.viewer.pk}'], 1)
+        self.assertEqual(self.get('/api/public-posts/?page_size=1', etag).status_code, 200)
+        self.assertEqual(self.get('/api/public-posts/?page_size=1', other_etag, user=self.other).status_code, 304)
+
+    def test_catalog_versions(self):
+        etag = self.get('/api/announcements/')['ETag']
+        self.assertEqual(self.get('/api/announcements/', etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Announcement.objects.create(title='Sale', content='Everything half off')
+        self.assertEqual(self.get('/api/announcements/', etag).status_code, 200)
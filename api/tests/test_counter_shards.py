@@ -0,0 +1,60 @@
+from django.core.cache import cache
+
+from api.models import Post, PostCounterShard
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class CounterShardTests(APITestCase):
+    """Likes on a hot post land in shard rows and are folded back into the columns."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = make_user('author')
+        self.fans = [make_user(f'fan{i}') for i in range(3)]
+        self.post = make_post(self.author, caption='a viral design')
+        PostCounterShard.promote(self.post)
+
+    def like(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            return client_for(user).post(f'/api/posts/{self.post.id}/like/')
+
+    def test_promote_creates_every_slot(self):
+        self.assertTrue(Post.objects.get(pk=self.post.pk).sharded_counters)
+        self.assertEqual(
+            PostCounterShard.objects.filter(post=self.post).count(),
+            PostCounterShard.SHARD_COUNT * len(PostCounterShard.FIELDS),
+        )
+
+    def test_likes_are_counted_while_they_sit_in_shards(self):
+        for fan in self.fans:
+            response = self.like(fan)
+            self.assertEqual(response.status_code, 201)
+        # Fold at most once per FOLD_INTERVAL, so the later likes stay in the shards
+        self.assertEqual(response.data['like_count'], 3)
+        self.assertEqual(self.post.counter_value('like_count'), 3)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.received_likes, 3)
+
+    def test_fold_moves_shard_totals_into_the_columns(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.like(self.fans[0])  # unlike
+        PostCounterShard.fold(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+        self.assertFalse(PostCounterShard.objects.filter(post=self.post).exclude(value=0).exists())
+        self.assertEqual(self.post.counter_value('like_count'), 2)
+
+    def test_fold_pending_updates_stale_instances(self):
+        for fan in self.fans:
+            self.like(fan)
+        PostCounterShard.fold(self.post.pk)
+        PostCounterShard.add(self.post, 'like_count', 1)
+        stale = Post.objects.get(pk=self.post.pk)
+        version = stale.cache_version
+        cache.delete(f'counter-fold:{self.post.pk}')  # FOLD_INTERVAL has passed
+        PostCounterShard.fold_pending([stale])
+        self.assertEqual(stale.like_count, 4)
+        self.assertEqual(stale.cache_version, version + 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 4)
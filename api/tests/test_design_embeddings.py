@@ -0,0 +1,35 @@
+import numpy as np
+
+from api import design_embeddings
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class SimilarDesignTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('author')
+        self.posts = [make_post(self.user, sku=f'sku{i}') for i in range(4)]
+        base = np.zeros(design_embeddings.DIM, dtype=np.float32)
+        base[0] = 1
+        # Each design a little further from the first one
+        for i, post in enumerate(self.posts):
+            vector = base.copy()
+            vector[1] = i
+            design_embeddings.STORE.upsert(post.design_id, design_embeddings._normalise(vector))
+
+    def test_similar_designs_most_similar_first(self):
+        response = client_for(self.user).get(f'/api/design/{self.posts[0].design_id}/similar/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([item['id'] for item in results], [self.posts[1].design_id, self.posts[2].design_id])
+        self.assertGreater(results[0]['similarity'], results[1]['similarity'])
+
+    def test_post_fieldset_does_not_apply_to_related_designs(self):
+        response = client_for(self.user).get(f'/posts/{self.posts[0].id}/', {'fields': 'caption,like_count'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('description', response.data)
+        related = response.data['related_designs']
+        self.assertEqual(related[0]['id'], self.posts[1].design_id)
+        self.assertIn('sku', related[0])
+        self.assertIn('similarity', related[0])
@@ -0,0 +1,72 @@
+from api.models import CustomUser, Notification, Post
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class EngagementInvariantTests(APITestCase):
+    """Toggling likes and favorites keeps the denormalized counters in step."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = make_user('author')
+        self.fans = [make_user(f'fan{i}') for i in range(3)]
+        self.post = make_post(self.author, caption='a design')
+
+    def toggle(self, user, kind='like'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return client_for(user).post(f'/api/posts/{self.post.id}/{kind}/')
+
+    def assertCounters(self, likes, unread):
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.post.like_count, likes)
+        self.assertEqual(self.post.like_count, self.post.likes.count())
+        self.assertEqual(self.author.received_likes, likes)
+        self.assertEqual(self.author.unread_notifications, unread)
+        self.assertEqual(self.author.unread_notifications, self.author.notifications.filter(is_read=False).count())
+
+    def test_like_and_unlike(self):
+        response = self.toggle(self.fans[0])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['like_count'], 1)
+        self.assertCounters(likes=1, unread=1)
+
+        response = self.toggle(self.fans[0])
+        self.assertEqual(response.data['like_count'], 0)
+        self.assertCounters(likes=0, unread=0)
+
+    def test_likes_coalesce_into_one_notification_of_distinct_actors(self):
+        for fan in self.fans:
+            self.toggle(fan)
+        # The first fan unlikes and likes again; still three people
+        self.toggle(self.fans[0])
+        self.toggle(self.fans[0])
+        self.assertCounters(likes=3, unread=1)
+        notification = Notification.objects.get(user=self.author)
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.sample_actors, ['fan0', 'fan2', 'fan1'])
+
+        for fan in self.fans:
+            self.toggle(fan)
+        self.assertCounters(likes=0, unread=0)
+
+    def test_user_save_keeps_concurrent_counter_updates(self):
+        stale = CustomUser.objects.get(pk=self.author.pk)
+        self.toggle(self.fans[0])
+        stale.first_name = 'Renamed'
+        stale.save()
+        self.assertCounters(likes=1, unread=1)
+        self.assertEqual(self.author.first_name, 'Renamed')
+
+    def test_decrements_stop_at_zero(self):
+        self.toggle(self.fans[0])
+        Post.objects.filter(pk=self.post.pk).update(like_count=0, comment_count=1)
+        CustomUser.objects.filter(pk=self.author.pk).update(received_likes=0)
+        response = self.toggle(self.fans[0])
+        self.assertEqual(response.data['like_count'], 0)
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.adjust_counter('comment_count', -3)
+        post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((post.like_count, post.comment_count, self.author.received_likes), (0, 0, 0))
@@ -0,0 +1,43 @@
+from api.models import Design
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class FacetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('author')
+        rows = [
+            ('Anime', 'iphone 14', 'clear case', True),
+            ('Anime', 'iphone 15', 'clear case', True),
+            ('Anime', 'iphone 15', 'solid case', False),
+            ('Nature', 'iphone 15', 'clear case', True),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, (theclass, modell, type_, stock) in enumerate(rows):
+                post = make_post(self.user, sku=f'sku{i}', modell=modell, type=type_, theclass=theclass)
+                Design.objects.filter(pk=post.design_id).update(stock=stock)
+
+    def facets(self, **params):
+        response = client_for().get('/api/designs/facets/', params)
+        self.assertEqual(response.status_code, 200)
+        return {facet: {row['value']: row['count'] for row in rows} for facet, rows in response.data.items()}
+
+    def test_counts_every_facet(self):
+        facets = self.facets()
+        self.assertEqual(facets['theclass'], {'Anime': 3, 'Nature': 1})
+        self.assertEqual(facets['modell'], {'iphone 14': 1, 'iphone 15': 3})
+        self.assertEqual(facets['stock'], {True: 3, False: 1})
+
+    def test_a_facet_ignores_its_own_filter(self):
+        facets = self.facets(theclass='Anime', stock='true')
+        # Other classes are still offered, counted under the stock filter
+        self.assertEqual(facets['theclass'], {'Anime': 2, 'Nature': 1})
+        self.assertEqual(facets['type'], {'clear case': 2})
+        self.assertEqual(facets['stock'], {True: 2, False: 1})
+
+    def test_design_changes_invalidate_cached_counts(self):
+        self.assertEqual(self.facets()['theclass'], {'Anime': 3, 'Nature': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            make_post(self.user, sku='new', theclass='Nature')
+        self.assertEqual(self.facets()['theclass'], {'Anime': 3, 'Nature': 2})
@@ -0,0 +1,45 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class FragmentCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user('author')
+        self.fan = make_user('fan')
+        self.posts = [make_post(self.author, caption=f'post {i}', sku=f'sku{i}') for i in range(3)]
+
+    def feed(self, user):
+        return {item['id']: item for item in client_for(user).get('/recent-posts/').data}
+
+    def test_warm_feed_skips_serialization_queries(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.feed(self.fan)
+        with CaptureQueriesContext(connection) as warm:
+            self.feed(self.fan)
+        self.assertLess(len(warm), len(cold))
+
+    def test_viewer_fields_are_not_shared_between_viewers(self):
+        post = self.posts[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            client_for(self.fan).post(f'/api/posts/{post.id}/like/')
+
+        self.assertTrue(self.feed(self.fan)[post.id]['is_liked'])
+        self.assertFalse(self.feed(self.author)[post.id]['is_liked'])
+        self.assertEqual(self.feed(self.author)[post.id]['like_count'], 1)
+
+    def test_writes_retire_fragments(self):
+        post = self.posts[0]
+        self.feed(self.fan)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client_for(self.fan).post(f'/api/posts/{post.id}/comment/', {'content': 'first!'})
+        item = self.feed(self.fan)[post.id]
+        self.assertEqual(item['comment_count'], 1)
+        self.assertEqual([comment['content'] for comment in item['comments']], ['first!'])
+
+        post.design.sku = 'renamed'
+        post.design.save()
+        self.assertEqual(self.feed(self.fan)[post.id]['design']['sku'], 'renamed')
@@ -0,0 +1,36 @@
+from api.models import Hashtag
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class HashtagFeedTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('author')
+        self.client = client_for(self.user)
+
+    def tagged_post(self, *names, caption=''):
+        post = make_post(self.user, caption=caption)
+        post.add_hashtags(list(names))
+        return post
+
+    def test_feed_pages_the_tagged_posts_newest_first(self):
+        tagged = [self.tagged_post('Cats', caption=f'cat {i}') for i in range(3)]
+        self.tagged_post('dogs')
+
+        response = self.client.get('/api/hashtags/cats/posts/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['hashtag'], 'Cats')
+        self.assertEqual([item['id'] for item in response.data['results']], [tagged[2].id, tagged[1].id])
+
+        response = self.client.get('/api/hashtags/CATS/posts/', {'page_size': 2, 'cursor': response.data['next_cursor']})
+        self.assertEqual([item['id'] for item in response.data['results']], [tagged[0].id])
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_tags_are_reused_case_insensitively(self):
+        self.tagged_post('Cats')
+        self.tagged_post(' cats ', 'CATS')
+        self.assertEqual(Hashtag.objects.count(), 1)
+
+    def test_unknown_tag_is_a_404(self):
+        self.assertEqual(self.client.get('/api/hashtags/nothing/posts/').status_code, 404)
@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from api import leaderboards, topk
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class TopKTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_offer_keeps_the_best_k(self):
+        topk.read('test', lambda: [(1, 5.0), (2, 3.0)], 60)
+        topk.offer('test', 3, 4.0, 2, 60)
+        self.assertEqual(topk.read('test', list, 60), [(1, 5.0), (3, 4.0)])
+        topk.offer('test', 1, 0, 2, 60)
+        self.assertEqual(topk.read('test', list, 60), [(3, 4.0)])
+
+    def test_offer_ignores_lists_that_are_not_cached(self):
+        topk.offer('missing', 1, 5.0, 2, 60)
+        self.assertEqual(topk.read('missing', lambda: [], 60), [])
+
+
+class LeaderboardTests(APITestCase):
+    """Likes and posts move the leaderboard totals the top-users endpoints read."""
+
+    def setUp(self):
+        super().setUp()
+        self.authors = [make_user(f'author{i}') for i in range(2)]
+        self.fans = [make_user(f'fan{i}') for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts = [
+                make_post(self.authors[0], sku='sku0'),
+                make_post(self.authors[1], sku='sku1'),
+                make_post(self.authors[1], sku='sku2'),
+            ]
+
+    def like(self, user, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            client_for(user).post(f'/api/posts/{post.id}/like/')
+
+    def board(self, path, **params):
+        response = client_for().get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['username'], row['total_likes'], row['total_posts']) for row in response.data]
+
+    def test_top_users_by_posts(self):
+        self.assertEqual(self.board('/top-users-by-posts/'), [('author1', 0, 2), ('author0', 0, 1)])
+
+    def test_likes_update_the_cached_board(self):
+        self.assertEqual(self.board('/top-users-by-likes/'), [])
+        for fan in self.fans:
+            self.like(fan, self.posts[0])
+        self.like(self.fans[0], self.posts[1])
+        self.assertEqual(self.board('/top-users-by-likes/'), [('author0', 3, 1), ('author1', 1, 2)])
+        self.assertEqual(self.board('/top-users-by-likes/', window='week'), [('author0', 3, 1), ('author1', 1, 2)])
+
+        # An unlike lowers the total, and a board at zero drops the user
+        self.like(self.fans[0], self.posts[1])
+        self.assertEqual(self.board('/top-users-by-likes/'), [('author0', 3, 1)])
+
+    def test_deleting_a_post_releases_its_likes_and_itself(self):
+        for fan in self.fans:
+            self.like(fan, self.posts[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts[0].delete()
+        self.assertEqual(self.board('/top-users-by-likes/'), [])
+        self.assertEqual(self.board('/top-users-by-posts/', window='month'), [('author1', 0, 2)])
+
+    def test_rebuild_matches_the_incremental_totals(self):
+        for fan in self.fans[:2]:
+            self.like(fan, self.posts[2])
+        before = leaderboards.totals([author.id for author in self.authors])
+        leaderboards.rebuild()
+        self.assertEqual(leaderboards.totals([author.id for author in self.authors]), before)
+        self.assertEqual(leaderboards.top('likes'), [(self.authors[1].id, 2)])
+
+    def test_unknown_window(self):
+        response = client_for().get('/top-users-by-likes/', {'window': 'year'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,41 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.loaders import DataLoader, get_loader
+from api.models import Comment, Post
+
+from . import APITestCase, make_post, make_user
+
+
+class DataLoaderTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authors = [make_user(f'author{i}') for i in range(3)]
+        for i in range(6):
+            make_post(self.authors[i % 3], caption=f'post {i}', sku=f'sku{i}')
+
+    def test_one_query_per_relation_and_identity_map(self):
+        posts = list(Post.objects.all())
+        loader = DataLoader()
+        with CaptureQueriesContext(connection) as queries:
+            loader.load(posts, 'user', 'design')
+            [post.user.username for post in posts]
+            [post.design.sku for post in posts]
+        self.assertEqual(len(queries), 2)
+        self.assertIs(posts[0].user, posts[3].user)
+
+        # Comment authors who also wrote posts are not fetched again
+        comments = [Comment.objects.create(post=posts[0], user=author, content='hi') for author in self.authors]
+        comments = list(Comment.objects.filter(pk__in=[comment.pk for comment in comments]))
+        with CaptureQueriesContext(connection) as queries:
+            loader.load(comments, 'user')
+        self.assertEqual(len(queries), 0)
+        self.assertIs(comments[0].user, posts[0].user)
+
+    def test_loader_is_shared_by_the_request(self):
+        request = Request(APIRequestFactory().get('/'))
+        self.assertIs(get_loader({'request': request}), get_loader({'request': request._request}))
+        context = {}
+        self.assertIs(get_loader(context), get_loader(context))
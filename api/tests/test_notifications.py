@@ -0,0 +1,63 @@
+from django.test import SimpleTestCase
+
+from api.models import CustomUser, Notification
+from api.notifications import render_message
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class RenderMessageTests(SimpleTestCase):
+    def test_messages(self):
+        self.assertEqual(render_message('like', ['amy'], 1), 'amy liked your design')
+        self.assertEqual(render_message('like', ['amy', 'bo'], 2), 'amy and bo liked your design')
+        self.assertEqual(render_message('favorite', ['amy', 'bo'], 3), 'amy and 2 others favorited your design')
+        self.assertEqual(render_message('like', ['amy'], 2), 'amy and 1 other liked your design')
+        self.assertEqual(render_message('like', [], 4), '4 people liked your design')
+
+
+class NotificationListTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = make_user('author')
+        self.fan = make_user('fan')
+        self.posts = [make_post(self.author, sku=f'sku{i}') for i in range(5)]
+        # One like notification per design, newest last
+        for post in self.posts:
+            with self.captureOnCommitCallbacks(execute=True):
+                client_for(self.fan).post(f'/api/posts/{post.id}/like/')
+
+    @property
+    def reader(self):
+        # Reloaded per request, like token authentication does, for a current unread_notifications
+        return client_for(CustomUser.objects.get(pk=self.author.pk))
+
+    def test_pages_follow_the_cursor(self):
+        response = self.reader.get('/api/notifications/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['unread_count'], 5)
+        seen = [item['id'] for item in response.data['notifications']]
+        while response.data['next_cursor']:
+            response = self.reader.get('/api/notifications/', {'page_size': 2, 'cursor': response.data['next_cursor']})
+            seen += [item['id'] for item in response.data['notifications']]
+
+        newest_first = list(Notification.objects.filter(user=self.author).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, newest_first)
+
+    def test_unread_filter_and_count(self):
+        self.assertEqual(self.reader.get('/api/notifications/unread-count/').data, {'unread_count': 5})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.reader.post(f'/api/notifications/{Notification.objects.first().id}/read/')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.reader.get('/api/notifications/unread-count/').data, {'unread_count': 0})
+        self.assertEqual(self.reader.get('/api/notifications/', {'unread': 'true'}).data['notifications'], [])
+        self.assertEqual(len(self.reader.get('/api/notifications/').data['notifications']), 5)
+
+    def test_deleting_an_unread_notification_lowers_the_count(self):
+        notification = Notification.objects.filter(user=self.author).first()
+        response = self.reader.delete(f'/api/notifications/{notification.id}/delete/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.reader.get('/api/notifications/unread-count/').data, {'unread_count': 4})
+
+    def test_requires_authentication(self):
+        self.assertEqual(client_for().get('/api/notifications/unread-count/').status_code, 401)
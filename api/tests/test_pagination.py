@@ -0,0 +1,94 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.models import Comment, Post
+from api.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, get_page_size
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class PaginationTests(SimpleTestCase):
+    def test_cursor_round_trips_datetime_and_float(self):
+        when = datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=dt_timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(when, 42)), (when, 42))
+        self.assertEqual(decode_cursor(encode_cursor(1.25, 7), parse_value=float), (1.25, 7))
+
+    def test_malformed_cursor_is_a_parse_error(self):
+        for cursor in ('not-a-cursor', encode_cursor('yesterday', 1), ''):
+            with self.assertRaises(ParseError):
+                decode_cursor(cursor)
+
+    def test_page_size_is_clamped(self):
+        factory = APIRequestFactory()
+
+        def page_size(query):
+            return get_page_size(Request(factory.get('/', query)))
+
+        self.assertEqual(page_size({}), 20)
+        self.assertEqual(page_size({'page_size': '0'}), 1)
+        self.assertEqual(page_size({'page_size': '100000'}), MAX_PAGE_SIZE)
+        with self.assertRaises(ParseError):
+            page_size({'page_size': 'many'})
+
+
+class FeedPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('author')
+        self.posts = [make_post(self.user, caption=f'post {i}', sku=f'sku{i}') for i in range(5)]
+        # Two posts created in the same instant are told apart by id
+        Post.objects.filter(pk=self.posts[1].pk).update(created_at=self.posts[2].created_at)
+        self.newest_first = [post.id for post in sorted(
+            Post.objects.all(), key=lambda post: (post.created_at, post.id), reverse=True,
+        )]
+
+    def walk(self, url, results_key='results', **params):
+        client = client_for(self.user)
+        seen, cursor = [], None
+        while True:
+            query = {'page_size': 2, **params}
+            if cursor:
+                query['cursor'] = cursor
+            response = client.get(url, query)
+            self.assertEqual(response.status_code, 200)
+            seen.append([item['id'] for item in response.data[results_key]])
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return seen
+
+    def test_feeds_page_newest_first_without_gaps_or_repeats(self):
+        for url in ('/api/public-posts/', '/recent-posts/', '/api/posts/', '/api/user-posts/'):
+            with self.subTest(url=url):
+                pages = self.walk(url)
+                self.assertEqual([len(page) for page in pages], [2, 2, 1])
+                self.assertEqual(sum(pages, []), self.newest_first)
+
+    def test_comments_page_newest_first(self):
+        post = self.posts[0]
+        comments = [Comment.objects.create(post=post, user=self.user, content=f'c{i}') for i in range(3)]
+        pages = self.walk(f'/api/posts/{post.id}/comments/', results_key='comments')
+        self.assertEqual(sum(pages, []), [comment.id for comment in reversed(comments)])
+
+    def test_page_cost_does_not_depend_on_depth(self):
+        client = client_for(self.user)
+        first = client.get('/api/public-posts/', {'page_size': 1})
+        with CaptureQueriesContext(connection) as shallow:
+            client.get('/api/public-posts/', {'page_size': 1, 'cursor': first.data['next_cursor']})
+        cursor = first.data['next_cursor']
+        for _ in range(3):
+            cursor = client.get('/api/public-posts/', {'page_size': 1, 'cursor': cursor}).data['next_cursor']
+        with CaptureQueriesContext(connection) as deep:
+            response = client.get('/api/public-posts/', {'page_size': 1, 'cursor': cursor})
+        self.assertEqual(response.data['next_cursor'], None)
+        self.assertEqual(len(deep), len(shallow))
+        self.assertNotIn('OFFSET', ' '.join(query['sql'] for query in deep.captured_queries))
+
+    def test_bad_cursor_is_a_400(self):
+        response = client_for(self.user).get('/api/public-posts/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from api import palette_index
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class PaletteTests(SimpleTestCase):
+    def test_parse_colour(self):
+        self.assertEqual(palette_index.parse_colour('#FF8000'), (255, 128, 0))
+        self.assertEqual(palette_index.parse_colour('#f80'), (255, 136, 0))
+        self.assertEqual(palette_index.parse_colour('rgb(1, 2, 3)'), (1, 2, 3))
+        self.assertIsNone(palette_index.parse_colour('rgb(300, 0, 0)'))
+        self.assertIsNone(palette_index.parse_colour('red'))
+
+    def test_lab_reference_points(self):
+        np.testing.assert_allclose(palette_index.rgb_to_lab((255, 255, 255)), [100, 0, 0], atol=0.01)
+        np.testing.assert_allclose(palette_index.rgb_to_lab((0, 0, 0)), [0, 0, 0], atol=0.01)
+
+    def test_squared_distances_match_brute_force(self):
+        palette = palette_index.rgb_to_lab([(200, 10, 10), (10, 200, 10), (10, 10, 200)])
+        vectors = palette_index.palette_vector(palette).reshape(1, -1)
+        query = palette_index.rgb_to_lab([(210, 20, 20), (0, 0, 0)])
+        for slot, squared in enumerate(palette_index._squared_distances(vectors, query)):
+            expected = ((palette[slot] - query) ** 2).sum(axis=1)
+            np.testing.assert_allclose(squared[0], expected, rtol=1e-4, atol=1e-2)
+
+    def test_missing_colour_is_far_from_everything(self):
+        palette = np.full((3, 3), np.nan, dtype=np.float32)
+        palette[0] = palette_index.rgb_to_lab((0, 0, 0))
+        vectors = palette_index.palette_vector(palette).reshape(1, -1)
+        query = palette_index.rgb_to_lab([(255, 255, 255)])
+        first, second, third = palette_index._squared_distances(vectors, query)
+        self.assertLess(math.sqrt(first[0, 0]), 101)
+        self.assertGreater(second[0, 0], 1e5)
+
+
+class ColourSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('author')
+        colours = [('#ff0000', '#ffffff'), ('#00ff00', '#ff0000'), ('#0000ff', '#000000')]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.designs = [
+                make_post(self.user, sku=f'sku{i}', color1=first, color2=second).design
+                for i, (first, second) in enumerate(colours)
+            ]
+
+    def search(self, **params):
+        response = client_for(self.user).get('/api/designs/by-colour/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_dominant_colour_ranks_first(self):
+        results = self.search(hex='#fe0101')
+        self.assertEqual([item['id'] for item in results[:2]], [self.designs[0].id, self.designs[1].id])
+        self.assertLess(results[0]['colour_distance'], results[1]['colour_distance'])
+
+    def test_sparse_fieldset_keeps_the_distances(self):
+        results = self.search(hex='#ff0000', fields='sku')
+        self.assertEqual([set(item) for item in results], [{'sku', 'colour_distance'}] * 3)
+
+    def test_design_palette_excludes_the_design_itself(self):
+        results = self.search(design=self.designs[0].id)
+        self.assertNotIn(self.designs[0].id, [item['id'] for item in results])
@@ -0,0 +1,68 @@
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import push
+from api.models import CustomUser, Notification
+
+from . import APITestCase, make_post, make_user
+
+
+def parse_event(chunk):
+    """(event, data) of one Server-Sent Events message."""
+    fields = dict(line.split(': ', 1) for line in chunk.decode().strip().splitlines() if not line.startswith('retry'))
+    return fields['event'], json.loads(fields['data'])
+
+
+class NotificationStreamTests(APITestCase):
+    """The SSE stream, delivered in-process by LocalBackend."""
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(push, '_backend', push.LocalBackend()))
+        # Streams a test leaves open stay out of the process-wide hub
+        self.enterContext(mock.patch.object(push, 'hub', push.Hub()))
+        self.author = make_user('author')
+        self.fan = make_user('fan')
+        self.post = make_post(self.author)
+        CustomUser.objects.filter(pk=self.author.pk).update(unread_notifications=2)
+
+    def stream_url(self, user):
+        return f'/api/notifications/stream/?token={AccessToken.for_user(user)}'
+
+    def test_needs_the_asgi_server(self):
+        response = self.client.get(self.stream_url(self.author))
+        self.assertEqual(response.status_code, 501)
+
+    async def test_rejects_missing_and_invalid_tokens(self):
+        response = await self.async_client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get('/api/notifications/stream/?token=nonsense')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_streams_the_unread_count_then_pushed_notifications(self):
+        response = await self.async_client.get(self.stream_url(self.author))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+
+        self.assertEqual(parse_event(await anext(events)), ('unread_count', {'type': 'unread_count', 'unread_count': 2}))
+        self.assertTrue(push.hub.has_streams(self.author.id))
+
+        notification = await sync_to_async(Notification.objects.create)(
+            user=self.author, action_user=self.fan, design=self.post.design,
+            notification_type='like', message='fan liked your design',
+        )
+        await sync_to_async(push.push_notification)(notification)
+        event, data = parse_event(await anext(events))
+        self.assertEqual(event, 'notification')
+        self.assertEqual(data['notification']['id'], notification.id)
+        self.assertEqual(data['unread_count'], 3)
+        await events.aclose()
+
+    def test_nothing_is_published_without_a_stream(self):
+        with mock.patch.object(push.LocalBackend, 'publish') as publish:
+            push.push_unread_count(self.author.id)
+        publish.assert_not_called()
@@ -0,0 +1,45 @@
+from api import search_index
+
+from . import APITestCase, make_post, make_user
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('author')
+
+    def index(self, *args, **kwargs):
+        post = make_post(self.user, *args, **kwargs)
+        search_index.index_post(post)
+        return post
+
+    def test_tokenize_lowercases_and_splits_words(self):
+        self.assertEqual(search_index.tokenize('Anime-Cats, #2024!'), ['anime', 'cats', '2024'])
+        self.assertEqual(search_index.tokenize(''), [])
+
+    def test_caption_match_outranks_description_match(self):
+        in_description = self.index(caption='sunset', description='a cat on a wall')
+        in_caption = self.index(caption='cat', description='on a wall at sunset')
+        self.index(caption='dog', description='nothing to see')
+
+        post_ids, cursor = search_index.search_posts('cat')
+        self.assertEqual(post_ids, [in_caption.id, in_description.id])
+        self.assertIsNone(cursor)
+
+    def test_last_term_matches_as_prefix_once_long_enough(self):
+        galaxy = self.index(caption='galaxy')
+        self.index(caption='garden')
+
+        self.assertEqual(search_index.search_posts('gala')[0], [galaxy.id])
+        # Too short to expand: matches only the exact term
+        self.assertEqual(search_index.search_posts('ga')[0], [])
+
+    def test_cursor_pages_cover_every_match_once(self):
+        posts = [self.index(caption='cat ' * (i % 3 + 1), description=f'number {i}') for i in range(7)]
+        seen, cursor = [], None
+        while True:
+            post_ids, cursor = search_index.search_posts('cat', cursor=cursor, limit=3)
+            seen.extend(post_ids)
+            if cursor is None:
+                break
+        self.assertCountEqual(seen, [post.id for post in posts])
@@ -0,0 +1,80 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Comment, CustomUser
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('author')
+        self.client = client_for(self.user)
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = make_post(make_user(f'poster{CustomUser.objects.count()}'), caption=f'post {i}')
+            Comment.objects.create(post=post, user=self.user, content='nice')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_fields_and_exclude_trim_the_output(self):
+        self.add_posts(1)
+        [item] = self.client.get('/api/public-posts/?fields=id,caption').data
+        self.assertEqual(set(item), {'id', 'caption'})
+
+        [item] = self.client.get('/api/public-posts/?exclude=comments,user_details,design').data
+        self.assertNotIn('comments', item)
+        self.assertNotIn('design', item)
+        self.assertIn('like_count', item)
+
+    def test_dropped_fields_cost_no_queries(self):
+        self.add_posts(3)
+        full, response = self.count_queries('/api/posts/')
+        self.assertEqual(len(response.data), 3)
+        sparse, response = self.count_queries('/api/posts/?fields=id,caption,like_count')
+        self.assertEqual(set(response.data[0]), {'id', 'caption', 'like_count'})
+        self.assertLess(sparse, full)
+
+        self.add_posts(3)
+        self.assertEqual(self.count_queries('/api/posts/?fields=id,caption,like_count')[0], sparse)
+        self.assertEqual(self.count_queries('/api/posts/')[0], full)
+
+    def test_query_parameters_never_drop_writable_fields(self):
+        design = make_post(self.user).design
+        response = self.client.post('/api/posts/?fields=id', {'design': design.id, 'caption': 'hello', 'description': 'world'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['caption'], 'hello')
+
+
+class DesignSerializerTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('author')
+        self.client = client_for(self.user)
+
+    def test_posts_summary_is_opt_in_and_flat(self):
+        post = make_post(self.user)
+        [item] = self.client.get('/api/designs/').data
+        self.assertNotIn('posts', item)
+
+        [item] = self.client.get('/api/designs/?include=posts').data
+        self.assertEqual(item['posts'], [{'id': post.id, 'like_count': 0, 'comment_count': 0, 'favorite_count': 0}])
+
+    def test_list_queries_do_not_grow_with_designs(self):
+        def count():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/designs/?include=posts')
+            return len(queries)
+
+        for i in range(2):
+            make_post(make_user(f'poster{i}'), sku=f'sku{i}')
+        baseline = count()
+        for i in range(2, 6):
+            make_post(make_user(f'poster{i}'), sku=f'sku{i}')
+        self.assertEqual(count(), baseline)
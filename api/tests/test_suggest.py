@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+
+from api.suggest import PrefixIndex
+
+
+class PrefixIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = PrefixIndex([
+            (1, 'Cats', 5, {'name': 'Cats'}),
+            (2, 'catalog', 9, {'name': 'catalog'}),
+            (3, 'dogs', 50, {'name': 'dogs'}),
+        ])
+
+    def names(self, prefix, k=10):
+        return [payload['name'] for payload, score in self.index.top(prefix, k)]
+
+    def test_top_is_case_insensitive_and_most_popular_first(self):
+        self.assertEqual(self.names('CA'), ['catalog', 'Cats'])
+        self.assertEqual(self.names('cat', k=1), ['catalog'])
+        self.assertEqual(self.names('x'), [])
+
+    def test_updates_reach_memoized_prefixes(self):
+        self.assertEqual(self.names('c'), ['catalog', 'Cats'])
+        self.index.bump(1, 10)
+        self.assertEqual(self.names('c'), ['Cats', 'catalog'])
+        self.index.upsert(4, 'cow', {'name': 'cow'}, score=100)
+        self.assertEqual(self.names('c'), ['cow', 'Cats', 'catalog'])
+        self.index.remove(4)
+        self.index.upsert(2, 'birds', {'name': 'birds'})
+        self.assertEqual(self.names('c'), ['Cats'])
+        self.assertEqual(self.names('b'), ['birds'])
@@ -0,0 +1,18 @@
+from django.test import SimpleTestCase
+
+from api import trending
+
+
+class TrendingTests(SimpleTestCase):
+    def test_event_weight_halves_every_half_life(self):
+        now = trending.EPOCH + 3 * trending.ERA_LENGTH + 1000
+        era = trending.era_of(now)
+        fresh = trending.era_scale(era, now)
+        older = trending.era_scale(era, now - trending.HALF_LIFE)
+        self.assertAlmostEqual(older / fresh, 0.5)
+
+    def test_rescaling_between_eras_preserves_order_and_ratio(self):
+        now = trending.EPOCH + 5 * trending.ERA_LENGTH
+        era = trending.era_of(now)
+        old_score = trending.era_scale(era - 1, now)
+        self.assertAlmostEqual(trending._rescale(old_score, era - 1, era), trending.era_scale(era, now))
@@ -0,0 +1,79 @@
+from django.test import override_settings
+
+from api.engagement import flush_intents
+from api.models import EngagementIntent, Like, Notification
+
+from . import APITestCase, client_for, make_post, make_user
+
+
+@override_settings(ENGAGEMENT_WRITE_BEHIND=True)
+class WriteBehindTests(APITestCase):
+    """Toggles queue intents; flush_intents applies the latest one per (user, post, kind)."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = make_user('author')
+        self.fans = [make_user(f'fan{i}') for i in range(2)]
+        self.post = make_post(self.author, caption='a design')
+
+    def like(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            return client_for(user).post(f'/api/posts/{self.post.id}/like/')
+
+    def flush(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return flush_intents()
+
+    def feed(self, user):
+        return {item['id']: item for item in client_for(user).get('/recent-posts/').data}
+
+    def test_toggle_only_queues_an_intent(self):
+        response = self.like(self.fans[0])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['like_count'], 1)
+        self.assertEqual(EngagementIntent.objects.count(), 1)
+        self.assertFalse(Like.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_flush_applies_intents(self):
+        for fan in self.fans:
+            self.like(fan)
+        self.assertEqual(self.flush(), 2)
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+        self.assertEqual(self.author.received_likes, 2)
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 2)
+        self.assertFalse(EngagementIntent.objects.exists())
+        self.assertEqual(Notification.objects.get(user=self.author).actor_count, 2)
+
+    def test_flip_flops_collapse_to_the_final_state(self):
+        self.like(self.fans[0])
+        response = self.like(self.fans[0])
+        self.assertFalse(response.data['is_liked'])
+        self.assertEqual(response.data['like_count'], 0)
+        self.like(self.fans[0])
+        self.like(self.fans[1])
+        self.like(self.fans[1])
+
+        self.assertEqual(self.flush(), 5)
+        self.assertEqual(list(Like.objects.values_list('user_id', flat=True)), [self.fans[0].id])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_feeds_show_the_viewers_own_unapplied_toggles(self):
+        self.feed(self.fans[0])
+        self.like(self.fans[0])
+
+        item = self.feed(self.fans[0])[self.post.id]
+        self.assertTrue(item['is_liked'])
+        self.assertEqual(item['like_count'], 1)
+        # Other viewers see the stored count until the flush
+        self.assertEqual(self.feed(self.fans[1])[self.post.id]['like_count'], 0)
+
+        self.flush()
+        item = self.feed(self.fans[0])[self.post.id]
+        self.assertTrue(item['is_liked'])
+        self.assertEqual(item['like_count'], 1)
+        self.assertEqual(self.feed(self.fans[1])[self.post.id]['like_count'], 1)
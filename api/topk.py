@@ -0,0 +1,40 @@
+import time
+
+from django.core.cache import cache
+
+
+# Bounded, best-first [(id, score)] lists kept in the cache. Writers move one
+# id at a time with offer(); every list is rebuilt from the database once its
+# ttl runs out, which also restores updates lost to concurrent writers.
+
+
+def read(key, build, ttl):
+    """The list under ``key``, built with ``build()`` if it is not cached."""
+    cached = cache.get(key)
+    if cached is None:
+        cached = {'built': time.time(), 'entries': build()}
+        cache.set(key, cached, timeout=ttl)
+    return cached['entries']
+
+
+def offer(key, item_id, score, k, ttl):
+    """
+    Put ``item_id`` at its place for ``score`` in the cached list (dropping it
+    when the score is not positive or too low for the top ``k``). Lists that
+    are not cached are left to be built by the next read.
+    """
+    cached = cache.get(key)
+    if cached is None:
+        return
+    entries = [entry for entry in cached['entries'] if entry[0] != item_id]
+    if score > 0 and (len(entries) < k or score > entries[-1][1]):
+        entries.append((item_id, score))
+        entries.sort(key=lambda entry: -entry[1])
+        del entries[k:]
+    remaining = ttl - (time.time() - cached['built'])
+    if remaining > 0:
+        cache.set(key, {'built': cached['built'], 'entries': entries}, timeout=remaining)
+
+
+def drop(key):
+    cache.delete(key)
@@ -0,0 +1,127 @@
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import topk
+from .models import Comment, Favorite, Like, TrendingScore
+
+
+# A design's trending score is the sum over its events of
+#   weight * 2 ** ((event time - now) / HALF_LIFE).
+# Scaling every score by the same factor keeps their order, so scores are
+# stored as of the start of their era rather than now: an event only adds
+# weight * 2 ** ((event time - era start) / HALF_LIFE) and nothing has to
+# decay in place. Eras bound that exponent by ERA_LENGTH / HALF_LIFE; a row
+# left in an older era is rescaled when its next event arrives.
+HALF_LIFE = 12 * 3600
+ERA_LENGTH = 7 * 86400
+EPOCH = 1704067200  # 2024-01-01 UTC
+
+# Counter field (as passed to Post.adjust_counter) -> (board, weight)
+EVENTS = {
+    'like_count': ('liked', 1.0),
+    'comment_count': ('liked', 1.5),
+    'favorite_count': ('liked', 2.0),
+}
+BOARDS = ('liked',)
+
+TOP_K = 50
+# Cached top-K lists (see api/topk.py) are rebuilt from the table this often
+TOP_K_TTL = 300
+
+
+def era_of(now):
+    return int((now - EPOCH) // ERA_LENGTH)
+
+
+def era_scale(era, now):
+    """Factor that turns a weight counted at ``now`` into ``era``'s units."""
+    return 2 ** ((now - EPOCH - era * ERA_LENGTH) / HALF_LIFE)
+
+
+def _rescale(score, from_era, to_era):
+    return score * 2 ** ((from_era - to_era) * ERA_LENGTH / HALF_LIFE)
+
+
+def _cache_key(board, era):
+    return f'trending:{board}:{era}'
+
+
+def record(event, design_id, count=1, now=None):
+    """Add ``count`` events (negative to retract them) to a design's trending score."""
+    board, weight = EVENTS[event]
+    now = time.time() if now is None else now
+    era = era_of(now)
+    amount = count * weight * era_scale(era, now)
+
+    rows = TrendingScore.objects.filter(board=board, design_id=design_id)
+    if not rows.filter(era=era).update(score=F('score') + amount):
+        try:
+            with transaction.atomic():
+                previous = rows.select_for_update().first()
+                if previous is None:
+                    TrendingScore.objects.create(board=board, design_id=design_id, era=era, score=amount)
+                else:
+                    previous.score = _rescale(previous.score, previous.era, era) + amount
+                    previous.era = era
+                    previous.save(update_fields=['score', 'era'])
+        except IntegrityError:
+            # A concurrent first event created the row
+            rows.filter(era=era).update(score=F('score') + amount)
+
+    score = rows.values_list('score', flat=True).first()
+    topk.offer(_cache_key(board, era), design_id, score or 0, TOP_K, TOP_K_TTL)
+
+
+def _build(board, era):
+    """Top-K of ``board`` from the table: this era's best plus the previous era's, rescaled."""
+    entries = []
+    for row_era in (era, era - 1):
+        rows = TrendingScore.objects.filter(board=board, era=row_era, score__gt=0).order_by('-score')
+        entries.extend(
+            (design_id, _rescale(score, row_era, era))
+            for design_id, score in rows.values_list('design_id', 'score')[:TOP_K]
+        )
+    entries.sort(key=lambda entry: -entry[1])
+    return entries[:TOP_K]
+
+
+def top(board, k=TOP_K, now=None):
+    """[(design_id, score)] of the k (at most TOP_K) designs trending on ``board``, best first."""
+    now = time.time() if now is None else now
+    era = era_of(now)
+    return topk.read(_cache_key(board, era), lambda: _build(board, era), TOP_K_TTL)[:k]
+
+
+def rebuild(now=None):
+    """
+    Recompute every score from the stored likes, comments and favorites
+    since the start of the previous era (older events have decayed to
+    nothing). Returns the number of scores written.
+    """
+    now = time.time() if now is None else now
+    era = era_of(now)
+    since = datetime.fromtimestamp(EPOCH + (era - 1) * ERA_LENGTH, tz=dt_timezone.utc)
+    sources = (
+        ('like_count', Like.objects.filter(created_at__gte=since).values_list('post__design_id', 'created_at')),
+        ('comment_count', Comment.objects.filter(created_at__gte=since).values_list('post__design_id', 'created_at')),
+        ('favorite_count', Favorite.objects.filter(created_at__gte=since).values_list('post__design_id', 'created_at')),
+    )
+    scores = Counter()
+    for event, rows in sources:
+        board, weight = EVENTS[event]
+        for design_id, at in rows.iterator(chunk_size=2000):
+            scores[(board, design_id)] += weight * era_scale(era, at.timestamp())
+
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            [TrendingScore(board=board, design_id=design_id, era=era, score=score) for (board, design_id), score in scores.items()],
+            batch_size=1000,
+        )
+    for board in BOARDS:
+        topk.drop(_cache_key(board, era))
+    return len(scores)
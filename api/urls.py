@@ -18,11 +18,14 @@ urlpatterns = [
     path('api/user/<int:user_id>/posts/most-liked/', get_user_most_liked_posts, name='user-most-liked-posts'),
     path('api/user/<int:user_id>/posts/most-commented/', get_user_most_commented_posts, name='user-most-commented-posts'),
     path('api/designs/', DesignListView.as_view(), name='design-list'),
+    path('api/designs/by-colour/', designs_by_colour, name='designs-by-colour'),
+    path('api/designs/facets/', design_facets, name='design-facets'),
     path('api/designs/anonymous/', create_anonymous_design, name='create-anonymous-design'),
     path('api/designs/test-null-user/', test_create_null_user_design, name='test-create-null-user-design'),
     path('api/designs/associate/', associate_anonymous_design, name='associate-anonymous-design'),
     path('api/design/<int:designid>/', get_design_by_id, name='get_design_by_id'),
     path('api/design/<int:design_id>/update-user/', update_design_user, name='update_design_user'),
+    path('api/design/<int:design_id>/similar/', similar_designs, name='similar-designs'),
     path('api/design/<int:design_id>/test/', test_design_null_user, name='test_design_null_user'),
     path('api/register/', registerview),
     path('api/login/', registerview),
@@ -38,6 +41,8 @@ urlpatterns = [
     path('api/posts/<int:post_id>/comments/', get_comments, name='add-comment'),
     path('api/posts/most-liked-designs/', most_liked_designs, name='add-comment'),
     path('api/posts/most-added-to-cart-designs/', most_added_to_cart_designs, name='add-comment'),
+    path('api/hashtags/<str:name>/posts/', hashtag_posts, name='hashtag-posts'),
+    path('api/suggest/', suggest_view, name='suggest'),
 
   path('api/delete-like/<int:design_id>/', delete_like, name='delete_like'),
 path('api/delete-fav/<int:design_id>/', delete_favorite, name='delete_favorite'),
@@ -53,6 +58,8 @@ path('api/delete-fav/<int:design_id>/', delete_favorite, name='delete_favorite')
 
 
     path('api/notifications/', get_notifications, name='get_notifications'),
+    path('api/notifications/unread-count/', unread_notification_count, name='unread_notification_count'),
+    path('api/notifications/stream/', notification_stream, name='notification_stream'),
     path('api/notifications/<int:notification_id>/read/',mark_as_read, name='mark_as_read'),
     path('api/notifications/<int:notification_id>/delete/', delete_notification, name='delete_notification'),
 
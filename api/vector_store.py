@@ -0,0 +1,129 @@
+import os
+
+import numpy as np
+from django.conf import settings
+from filelock import FileLock
+
+
+INITIAL_CAPACITY = 1024
+
+
+class VectorStore:
+    """
+    Fixed-width float32 vectors keyed by a positive integer id (a Design pk),
+    kept in two .npy files under settings.VECTOR_INDEX_DIR:
+
+        <name>.npy      (capacity, dim) vectors
+        <name>.ids.npy  (capacity,) int64 ids; 0 marks a free row
+
+    Every worker on the host memory-maps the same files, so an update made by
+    one worker is visible to the others without reloading anything. Writers
+    serialize on a file lock. When the store fills up it is copied into files
+    twice the size and swapped in with os.replace; readers notice the new inode
+    and reopen.
+    """
+
+    def __init__(self, name, dim):
+        self.name = name
+        self.dim = dim
+        self._opened = None  # (path and inode signature, ids, vectors)
+        self._file_lock = None
+
+    @property
+    def path(self):
+        return os.path.join(settings.VECTOR_INDEX_DIR, f'{self.name}.npy')
+
+    @property
+    def ids_path(self):
+        return os.path.join(settings.VECTOR_INDEX_DIR, f'{self.name}.ids.npy')
+
+    def arrays(self):
+        """
+        Return read-only (ids, vectors) memmaps covering every row, free rows
+        included; callers mask rows where ids == 0.
+        """
+        try:
+            signature = (self.path, os.stat(self.ids_path).st_ino, os.stat(self.path).st_ino)
+        except FileNotFoundError:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.dim), dtype=np.float32)
+
+        if self._opened is None or self._opened[0] != signature:
+            ids = np.load(self.ids_path, mmap_mode='r')
+            vectors = np.load(self.path, mmap_mode='r')
+            rows = min(len(ids), len(vectors))  # caught mid-resize: the common prefix is consistent
+            self._opened = (signature, ids[:rows], vectors[:rows])
+        return self._opened[1], self._opened[2]
+
+    def upsert(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self.lock():
+            ids, vectors = self._open_for_write()
+            row = self._find(ids, key)
+            if row is None:
+                free = np.flatnonzero(ids == 0)
+                if not len(free):
+                    ids, vectors = self._grow(ids, vectors)
+                    free = np.flatnonzero(ids == 0)
+                row = free[0]
+            # Hide the row while its vector is rewritten
+            ids[row] = 0
+            vectors[row] = vector
+            ids[row] = key
+            ids.flush()
+            vectors.flush()
+
+    def remove(self, key):
+        if not os.path.exists(self.ids_path):
+            return
+        with self.lock():
+            ids, vectors = self._open_for_write()
+            row = self._find(ids, key)
+            if row is not None:
+                ids[row] = 0
+                ids.flush()
+
+    def rebuild(self, rows):
+        """Replace the whole store with ``rows`` of (key, vector)."""
+        rows = list(rows)
+        capacity = max(INITIAL_CAPACITY, 2 * len(rows))
+        with self.lock():
+            self._write_files(
+                capacity,
+                [key for key, vector in rows],
+                [vector for key, vector in rows],
+            )
+        return len(rows)
+
+    def lock(self):
+        """The writers' lock; re-entrant, so a caller can hold it across a read and a rebuild."""
+        if self._file_lock is None or self._file_lock.lock_file != f'{self.path}.lock':
+            os.makedirs(settings.VECTOR_INDEX_DIR, exist_ok=True)
+            self._file_lock = FileLock(f'{self.path}.lock')
+        return self._file_lock
+
+    def _open_for_write(self):
+        if not os.path.exists(self.ids_path):
+            self._write_files(INITIAL_CAPACITY, [], [])
+        return np.load(self.ids_path, mmap_mode='r+'), np.load(self.path, mmap_mode='r+')
+
+    def _find(self, ids, key):
+        rows = np.flatnonzero(ids == key)
+        return rows[0] if len(rows) else None
+
+    def _grow(self, ids, vectors):
+        # Rows keep their positions, so a reader still on the old files agrees with the new ones
+        self._write_files(2 * len(ids), ids, vectors)
+        return self._open_for_write()
+
+    def _write_files(self, capacity, keys, vectors):
+        """Write fresh files next to the live ones, then swap them in."""
+        new_ids = np.lib.format.open_memmap(self.ids_path + '.tmp', mode='w+', dtype=np.int64, shape=(capacity,))
+        new_vectors = np.lib.format.open_memmap(self.path + '.tmp', mode='w+', dtype=np.float32, shape=(capacity, self.dim))
+        if len(keys):
+            new_ids[:len(keys)] = keys
+            new_vectors[:len(keys)] = vectors
+        new_ids.flush()
+        new_vectors.flush()
+        del new_ids, new_vectors
+        os.replace(self.path + '.tmp', self.path)
+        os.replace(self.ids_path + '.tmp', self.ids_path)
@@ -5,7 +5,11 @@ from .models import *
 from .serializers import *
 import os
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from asgiref.sync import sync_to_async
+import asyncio
 from django.views import View
 from django.conf import settings
 import requests
@@ -24,6 +28,7 @@ import io
 import base64
 from django.db.models import Count, Sum, Avg, FloatField, F, ExpressionWrapper, Value, DecimalField, Subquery, OuterRef, IntegerField
 from django.db.models import Q
+from django.db import transaction
 from django.utils import timezone
 from django.db.models.functions import TruncDate, ExtractHour, ExtractDay, Cast, Coalesce
 from PIL import Image
@@ -31,10 +36,19 @@ from io import BytesIO
 from cloudinary.uploader import upload
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ParseError
 from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework.exceptions import AuthenticationFailed
 
 from api.clip_classifier import classify_design  # Import the classification function
+from api.pagination import DEFAULT_PAGE_SIZE, get_page_size, is_cursor_request, keyset_filter, keyset_page
+from api.search_index import search_posts
+from api.suggest import MAX_SUGGESTIONS, suggest
+from api.engagement import record_change, record_intent, toggle_row
+from api import cart_activity, design_embeddings, facets, leaderboards, palette_index, push, trending
+from api.conditional import versioned_etag
 
 
 class DesignListView(generics.ListCreateAPIView):
@@ -68,6 +82,7 @@ class DesignListView(generics.ListCreateAPIView):
             design.save()
         except Exception as e:
             print(f"Error in classification: {e}")  
+        design_embeddings.embed_later(design)
 
 
 
@@ -170,6 +185,13 @@ def posts(request):
     if request.method == 'GET':
         # Fetch all posts
         all_posts = Post.objects.all().order_by('-created_at')
+
+        # ?cursor= / ?page_size= switch to keyset pagination
+        if is_cursor_request(request):
+            page, next_cursor = keyset_page(all_posts, request)
+            serializer = PostSerializer(page, many=True, context={'request': request})
+            return Response({'results': serializer.data, 'next_cursor': next_cursor})
+
         serializer = PostSerializer(all_posts, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -201,18 +223,17 @@ def posts(request):
 
         # Create the post directly with the design object
         try:
-            post = Post.objects.create(
-                user=request.user,
-                design=design,
-                caption=caption,
-                description=description
-            )
-            
-            # Add hashtags
-            for tag in hashtags[:5]:
-                if tag and len(tag.strip()) > 0:
-                    hashtag_obj, created = Hashtag.objects.get_or_create(name=tag.strip())
-                    post.hashtags.add(hashtag_obj)
+            # One transaction, so the post is indexed for search once with its hashtags
+            with transaction.atomic():
+                post = Post.objects.create(
+                    user=request.user,
+                    design=design,
+                    caption=caption,
+                    description=description
+                )
+
+                # Add hashtags
+                post.add_hashtags(hashtags)
             
             print(f"Post created successfully: {post.id}")
             
@@ -224,17 +245,35 @@ def posts(request):
             print(f"Error creating post: {e}")
             return Response({"error": f"Failed to create post: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# The posts a public_posts / recent_posts response shows, for their ETags
+def cursor_page_posts(request):
+    return keyset_filter(Post.objects.all(), request)[:get_page_size(request)]
+
+
+def public_feed_posts(request):
+    return cursor_page_posts(request) if is_cursor_request(request) else Post.objects.all()
+
+
+def recent_feed_posts(request):
+    return cursor_page_posts(request) if is_cursor_request(request) else Post.objects.order_by('-created_at')[:RECENT_POSTS]
+
+
 @api_view(['GET'])
+@versioned_etag('posts', vary_on_user=True, posts=public_feed_posts)
 def public_posts(request):
     posts = Post.objects.all().select_related('design', 'user')  # Fetch posts with related fields
+
+    next_cursor = None
+    paginated = is_cursor_request(request)
+    if paginated:
+        posts, next_cursor = keyset_page(posts, request)
     
-    # If user is authenticated, pass the request context to calculate is_liked/is_favorited
-    if request.user.is_authenticated:
-        serializer = PostSerializer(posts, many=True, context={'request': request})
-    else:
-        # For anonymous users, don't pass request context (will default to False for is_liked/is_favorited)
-        serializer = PostSerializer(posts, many=True)
+    # is_liked/is_favorited default to False for anonymous users; the request is
+    # still passed so options like ?comments_preview= are honored
+    serializer = PostSerializer(posts, many=True, context={'request': request, 'fragment_cache': True})
 
+    if paginated:
+        return Response({'results': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
     return Response(serializer.data, status=status.HTTP_200_OK)
 ###########################################################################################################################################################
 @api_view(['GET']) 
@@ -243,14 +282,9 @@ def get_user_posts(request, user_id):
     user = get_object_or_404(CustomUser, pk=user_id)
 
     # Fetch posts for the user with related data
+    # like_count / comment_count are stored on Post, no annotation needed
     posts = Post.objects.filter(user=user).select_related('design').order_by('-created_at')
     
-    # Annotate with like and comment counts
-    posts = posts.annotate(
-        like_count=Count('likes', distinct=True),
-        comment_count=Count('comments', distinct=True)
-    )
-    
     # --- NEW: Support ?as_user=<id> to check like/favorite for any user ---
     as_user_id = request.query_params.get('as_user')
     context = {'request': request}
@@ -276,110 +310,80 @@ from rest_framework.permissions import IsAuthenticated
 from .models import Post, Like, Favorite, Comment
 from .serializers import CommentSerializer
 
+def toggle_engagement(request, post_id, model, counter, notification_type):
+    """
+    Shared body of the like/favorite toggles: one joined read of the post and
+    its design, then a conditional delete-or-insert and the counter updates in
+    one transaction (see record_change). Returns (post, change) as from
+    toggle_row, or None when the post does not exist.
+    """
+    post = Post.objects.select_related('design').only(
+        'id', 'user_id', 'like_count', 'favorite_count', 'sharded_counters', 'design__id', 'design__user_id'
+    ).filter(id=post_id).first()
+    if post is None:
+        return None
+
+    if settings.ENGAGEMENT_WRITE_BEHIND:
+        # Queue it for flush_engagement and answer with the predicted state
+        change, offset = record_intent(notification_type, request.user.id, post.id)
+        setattr(post, counter, max(0, getattr(post, counter) + offset))
+        return post, change
+
+    with transaction.atomic():
+        change = toggle_row(model, request.user.id, post.id)
+        if change:
+            record_change(notification_type, post, request.user.id, change)
+            if post.sharded_counters:
+                setattr(post, counter, post.counter_value(counter))
+            else:
+                setattr(post, counter, max(0, getattr(post, counter) + change))
+    return post, change
+
+
 # Toggle like (add or remove)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def toggle_like(request, post_id):
-    try:
-        post = Post.objects.get(id=post_id)
-    except Post.DoesNotExist:
+    result = toggle_engagement(request, post_id, Like, 'like_count', 'like')
+    if result is None:
         return Response({"error": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
+    post, change = result
 
-    # Check if the user has already liked the post
-    existing_like = Like.objects.filter(user=request.user, post=post).first()
-
-    if existing_like:
-        # If the like already exists, remove it
-        existing_like.delete()
-
-        # Remove the like notification if it exists
-        Notification.objects.filter(
-            user=post.user,
-            action_user=request.user,
-            design=post.design,
-            notification_type='like'
-        ).delete()
-
-        # Check if the post owner still qualifies for a discount
-        post_owner = post.user
-        if not post_owner.is_discount_eligible():
-            post_owner.is_discount_eligible = False
-            post_owner.save()
-
+    if change < 0:
         return Response({
             "message": "Like removed.",
             "is_liked": False,
-            "like_count": post.likes.count()
+            "like_count": post.like_count
         }, status=status.HTTP_200_OK)
 
-    # Add the like
-    Like.objects.create(user=request.user, post=post)
-
-    # Create a notification when the like is added
-    notification_message = f"{request.user.username} liked your design"
-    Notification.objects.create(
-        user=post.design.user,  # The owner of the design
-        action_user=request.user,  # The user who liked the post
-        design=post.design,
-        notification_type='like',
-        message=notification_message
-    )
-
-    # Check if the post owner qualifies for a discount
-    post_owner = post.user
-    if post_owner.is_discount_eligible():
-        post_owner.is_discount_eligible = True
-        post_owner.save()
-
     return Response({
         "message": "Like added.",
         "is_liked": True,
-        "like_count": post.likes.count()
-    }, status=status.HTTP_201_CREATED)
-
-
- 
+        "like_count": post.like_count
+    }, status=status.HTTP_201_CREATED if change else status.HTTP_200_OK)
 
 
 # Toggle favorite (add or remove)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def toggle_favorite(request, post_id):
-    try:
-        post = Post.objects.get(id=post_id)
-    except Post.DoesNotExist:
+    result = toggle_engagement(request, post_id, Favorite, 'favorite_count', 'favorite')
+    if result is None:
         return Response({"error": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
+    post, change = result
 
-    # Use get_or_create for toggling favorite, and delete if already exists
-    favorite, created = Favorite.objects.get_or_create(user=request.user, post=post)
-
-    if not created:  # If the favorite already exists, remove it
-        favorite.delete()
-
-        # Remove the favorite notification if it exists
-        Notification.objects.filter(user=post.user, action_user=request.user, design=post.design, notification_type='favorite').delete()
-
+    if change < 0:
         return Response({
             "message": "Favorite removed.",
             "is_favorited": False,
-            "favorite_count": post.favorites.count()
+            "favorite_count": post.favorite_count
         }, status=status.HTTP_200_OK)
 
-    # Create a notification when the favorite is added
-    notification_message = f"{request.user.username} favorited your design"
-    Notification.objects.create(
-        user=post.design.user,  # The owner of the design
-        action_user=request.user,  # The user who added to favorites
-        design=post.design,
-        notification_type='favorite',
-        message=notification_message
-    )
-
     return Response({
         "message": "Favorite added.",
         "is_favorited": True,
-        "favorite_count": post.favorites.count()
-    }, status=status.HTTP_201_CREATED)
+        "favorite_count": post.favorite_count
+    }, status=status.HTTP_201_CREATED if change else status.HTTP_200_OK)
 
 # Delete a comment
 @api_view(['DELETE'])
@@ -397,7 +401,9 @@ def delete_comment(request, comment_id):
     # Delete the notification related to this comment if it exists
     Notification.objects.filter(user=comment.post.design.user, action_user=request.user, design=comment.post.design, notification_type='comment').delete()
 
-    comment.delete()
+    with transaction.atomic():
+        comment.delete()
+        comment.post.adjust_counter('comment_count', -1)
     return Response({"message": "Comment deleted."}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -408,12 +414,20 @@ def get_comments(request, post_id):
     try:
         # Fetch all comments for the given post
         comments = Comment.objects.filter(post_id=post_id).select_related('user')
+
+        # ?cursor= / ?page_size= page through the full thread newest first
+        if is_cursor_request(request):
+            page, next_cursor = keyset_page(comments, request)
+            serializer = CommentSerializer(page, many=True)
+            return Response({'comments': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
         
         # Serialize the comments
         serializer = CommentSerializer(comments, many=True)
         
         # Return the list of comments as a response
         return Response({'comments': serializer.data}, status=status.HTTP_200_OK)
+    except ParseError as e:
+        return Response({'error': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -426,7 +440,7 @@ def user_favorites(request):
     """
     Get all designs favorited by the authenticated user.
     """
-    favorites = Favorite.objects.filter(user=request.user)
+    favorites = Favorite.objects.filter(user=request.user).select_related('post__design__user')
     designs = [favorite.post.design for favorite in favorites]
 
     # Pass the request to the serializer's context
@@ -441,7 +455,7 @@ def user_liked(request):
     """
     Get all designs liked by the authenticated user.
     """
-    liked_designs = Like.objects.filter(user=request.user)
+    liked_designs = Like.objects.filter(user=request.user).select_related('post__design__user')
     designs = [like.post.design for like in liked_designs]
 
     # Pass the request to the serializer's context
@@ -456,10 +470,12 @@ def user_liked(request):
 def delete_like(request, design_id):
     try:
         # Get the post linked to the design
-        post = Post.objects.get(design__id=design_id)
+        post = Post.objects.select_related('design').get(design__id=design_id)
         # Get the like by the user
         like = Like.objects.get(user=request.user, post=post)
-        like.delete()
+        with transaction.atomic():
+            like.delete()
+            record_change('like', post, request.user.id, -1)
         return Response({'success': 'Like removed.'})
     except Post.DoesNotExist:
         return Response({'error': 'Post not found for this design.'}, status=404)
@@ -473,10 +489,12 @@ def delete_like(request, design_id):
 def delete_favorite(request, design_id):
     try:
         # Get the post linked to the design
-        post = Post.objects.get(design__id=design_id)
+        post = Post.objects.select_related('design').get(design__id=design_id)
         # Get the favorite by the user for this post
         favorite = Favorite.objects.get(user=request.user, post=post)
-        favorite.delete()
+        with transaction.atomic():
+            favorite.delete()
+            record_change('favorite', post, request.user.id, -1)
         return Response({"message": "Removed from favorites successfully."}, status=204)
     except Post.DoesNotExist:
         return Response({'error': 'Post not found for this design.'}, status=404)
@@ -490,24 +508,98 @@ def delete_favorite(request, design_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_notifications(request):
+    """
+    The user's notifications newest first, one keyset page at a time
+    (?cursor=, ?page_size=), optionally only the unread ones (?unread=true).
+    """
     user = request.user
 
-    # Get all notifications for the user, ordered by the creation date (most recent first)
-    notifications = Notification.objects.filter(user=user).order_by('-created_at')
+    notifications = Notification.objects.filter(user=user).select_related('action_user', 'design')
+    if request.query_params.get('unread', '').lower() in ('1', 'true', 'yes'):
+        notifications = notifications.filter(is_read=False)
+    page, next_cursor = keyset_page(notifications, request)
 
     # Serialize the notifications
-    serializer = NotificationSerializer(notifications, many=True)
+    serializer = NotificationSerializer(page, many=True, context={'request': request})
 
-    return Response({'notifications': serializer.data}, status=status.HTTP_200_OK)
+    return Response({
+        'notifications': serializer.data,
+        'next_cursor': next_cursor,
+        'unread_count': user.unread_notifications,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def unread_notification_count(request):
+    # Counter on the user row, which authentication has already loaded
+    return Response({'unread_count': request.user.unread_notifications}, status=status.HTTP_200_OK)
+
+
+# Seconds between keep-alive comments on an idle notification stream
+STREAM_KEEPALIVE = 15
+
+
+def _stream_user(request):
+    """The user of a stream request, from the Bearer header or ?token= (EventSource cannot set headers)."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
 
 
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the user's notifications: an 'unread_count'
+    event on connect, then 'notification' (new or coalesced) and
+    'unread_count' events as they happen (api/push.py). Clients holding the
+    stream need not poll get_notifications. Needs the ASGI application.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Streaming requires the ASGI server.'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    queue = push.hub.subscribe(user.id)
+    stream_id = push.new_stream_id()
+    await sync_to_async(push.connected)(user.id, stream_id)
+
+    async def events():
+        try:
+            yield f"retry: 5000\nevent: unread_count\ndata: {json.dumps({'type': 'unread_count', 'unread_count': user.unread_notifications})}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    await sync_to_async(push.connected)(user.id, stream_id)
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+        finally:
+            push.hub.unsubscribe(user.id, queue)
+            await sync_to_async(push.disconnected)(user.id, stream_id)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Let nginx pass events through unbuffered
+    return response
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_as_read(request, notification_id):
     try:
-        notifications = Notification.objects.filter(user=request.user, is_read=False)
-        notifications.update(is_read=True)
+        with transaction.atomic():
+            notifications = Notification.objects.filter(user=request.user, is_read=False)
+            marked = notifications.update(is_read=True)
+            CustomUser.adjust_unread_notifications(request.user.id, -marked)
+            transaction.on_commit(lambda: push.push_unread_count(request.user.id))
         return Response({"message": "All notifications marked as read."}, status=status.HTTP_200_OK)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -591,6 +683,12 @@ def user_posts(request):
     Fetch all posts by the authenticated user.
     """
     user_posts = Post.objects.filter(user=request.user).order_by('-created_at')
+
+    if is_cursor_request(request):
+        page, next_cursor = keyset_page(user_posts, request)
+        serializer = PostSerializer(page, many=True, context={'request': request})
+        return Response({'results': serializer.data, 'next_cursor': next_cursor})
+
     serializer = PostSerializer(user_posts, many=True, context={'request': request})
     return Response(serializer.data)
 
@@ -1251,22 +1349,17 @@ def user_detail(request, id):
 
 @api_view(['GET'])
 def most_liked_designs(request):
-    print("[most_liked_designs] Request user:", request.user, "Authenticated:", request.user.is_authenticated)
     try:
-        # Fetch designs with their related post like counts
-        designs = Design.objects.annotate(
-            like_count=Count('posts__likes')
-        ).filter(like_count__gt=0)  # Get designs with at least one like
-
-        # Limit the designs by the most likes (using Python)
-        designs = sorted(designs, key=lambda x: x.like_count, reverse=True)[:16]
-
-        if not designs:
+        # Read straight off the time-decayed trending board (api/trending.py)
+        ranking = [design_id for design_id, score in trending.top('liked', 16)]
+        if not ranking:
             return Response({'message': 'No liked designs available'}, status=status.HTTP_200_OK)
 
-        # Fetch posts related to these designs
-        posts = Post.objects.filter(design__in=designs).select_related('design', 'user')
-        post_serializer = PostSerializer(posts, many=True, context={'request': request})
+        posts = sorted(
+            Post.objects.filter(design_id__in=ranking).select_related('design', 'user'),
+            key=lambda post: ranking.index(post.design_id),
+        )
+        post_serializer = PostSerializer(posts, many=True, context={'request': request, 'fragment_cache': True})
 
         return Response(post_serializer.data, status=status.HTTP_200_OK)
     except Exception as e:
@@ -1275,19 +1368,19 @@ def most_liked_designs(request):
 @api_view(['GET'])
 def most_added_to_cart_designs(request):
     try:
-        # Fetch designs with their related cart counts
-        designs = Design.objects.annotate(
-            cart_count=Count('chart')
-        ).filter(cart_count__gt=0)  # Get designs with at least one cart addition
-
-        if not designs.exists():
+        # Summed from the hourly cart-add buckets of the last ?hours= (default 24)
+        try:
+            hours = int(request.query_params.get('hours', cart_activity.DEFAULT_HOURS))
+        except ValueError:
+            return Response({'error': 'hours must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        ranking = [design_id for design_id, count in cart_activity.top(hours, 10)]
+        if not ranking:
             return Response({'message': 'No designs added to cart yet'}, status=status.HTTP_200_OK)
 
-        # Sort the designs by cart count in descending order (using Python)
-        designs = sorted(designs, key=lambda x: x.cart_count, reverse=True)[:10]
-
-        # Fetch posts related to these top 10 designs
-        posts = Post.objects.filter(design__in=designs).select_related('design', 'user')
+        posts = sorted(
+            Post.objects.filter(design_id__in=ranking).select_related('design', 'user'),
+            key=lambda post: ranking.index(post.design_id),
+        )
         post_serializer = PostSerializer(posts, many=True, context={'request': request})
 
         return Response(post_serializer.data, status=status.HTTP_200_OK)
@@ -1316,16 +1409,13 @@ def search(request):
             # Get the custom User model
             User = get_user_model()
 
-            # Search in the Post model (including hashtags)
-            posts = Post.objects.filter(
-                Q(caption__icontains=query) |  # Case-insensitive search for caption
-                Q(description__icontains=query) |  # Case-insensitive search for description
-                Q(design__modell__icontains=query) |  # Search in the design's modell field
-                Q(design__sku__icontains=query) |  # Search in the design's SKU
-                Q(design__type__icontains=query) |  # Search in the design's type
-                Q(design__theclass__icontains=query) |  # Search in the design's theclass field
-                Q(hashtags__name__icontains=query)  # Search in hashtags (many-to-many relationship)
-            ).select_related('design', 'user').prefetch_related('hashtags').distinct()  # Preload related data and ensure unique results
+            # Rank posts from the search index (see api/search_index.py) instead of
+            # scanning every post with icontains
+            post_ids, next_cursor = search_posts(
+                query, cursor=request.query_params.get('cursor'), limit=get_page_size(request, DEFAULT_PAGE_SIZE)
+            )
+            found = Post.objects.in_bulk(post_ids)
+            posts = [found[post_id] for post_id in post_ids if post_id in found]
 
             # Search in the User model
             users = User.objects.filter(
@@ -1339,7 +1429,7 @@ def search(request):
             )
 
             # Set up context for serializer
-            context = {'request': request}
+            context = {'request': request, 'fragment_cache': True}
             if as_user_id:
                 try:
                     as_user = CustomUser.objects.get(pk=as_user_id)
@@ -1375,9 +1465,12 @@ def search(request):
             # Combine and return the results
             return Response({
                 'posts': post_serializer.data,
-                'users': user_data
+                'users': user_data,
+                'next_cursor': next_cursor
             }, status=status.HTTP_200_OK)
 
+        except ParseError as e:
+            return Response({'error': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     else:
@@ -1496,79 +1589,192 @@ def get_user_details(request, user_id):
     except CustomUser.DoesNotExist:
         return Response({'error': 'User not found'}, status=404)
 
+def leaderboard_response(request, metric, limit):
+    """
+    The top ``limit`` users by ``metric`` for ?window=all (default), week or
+    month, read from the cached leaderboard (api/leaderboards.py).
+    """
+    window = request.query_params.get('window', 'all')
+    if window not in leaderboards.WINDOWS:
+        return Response({'error': f"window must be one of {', '.join(leaderboards.WINDOWS)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    ranking = [user_id for user_id, total in leaderboards.top(metric, window, limit)]
+    users = CustomUser.objects.in_bulk(ranking)
+    totals = leaderboards.totals(ranking, window)
+    data = [
+        {
+            'user_id': user.id,
+            'username': user.username,
+            'profile_pic': user.profile_pic,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'total_likes': totals[user.id]['likes'],
+            'total_posts': totals[user.id]['posts'],
+        }
+        for user in (users[user_id] for user_id in ranking if user_id in users)
+    ]
+    return Response(data, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 def top_users_by_likes(request):
     try:
-        # Annotate users with the total likes on their posts
-        users = CustomUser.objects.annotate(
-            total_likes=Count('post__likes', distinct=True),
-            total_posts=Count('post', distinct=True)       
-        ).filter(total_likes__gt=0).order_by('-total_likes')[:5]
-        data = [
-            {
-                'user_id': user.id,     
-                'username': user.username,
-                'profile_pic': user.profile_pic,    
-                 'email' : user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'total_likes': user.total_likes,
-                'total_posts': user.total_posts  # Add total posts
-            }
-            for user in users
-        ]
-        return Response(data, status=status.HTTP_200_OK)
+        return leaderboard_response(request, 'likes', 5)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
 def top_users_by_posts(request):
     try:
-        # Annotate users with the total likes on their posts and total posts
-        users = CustomUser.objects.annotate(
-            total_likes=Count('post__likes', distinct=True),
-            total_posts=Count('post', distinct=True)
-        ).filter(total_posts__gt=0).order_by('-total_posts')[:4]  # Order by total posts
-        
-        data = [
-            {
-                'user_id': user.id,
-                'username': user.username,
-                'profile_pic': user.profile_pic,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'total_likes': user.total_likes,
-                'total_posts': user.total_posts  # Add total posts
-            }
-            for user in users
-        ]
-        
-        return Response(data, status=status.HTTP_200_OK)
+        return leaderboard_response(request, 'posts', 4)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['GET'])
+RECENT_POSTS = 10
+
 
+@api_view(['GET'])
+@versioned_etag('posts', vary_on_user=True, posts=recent_feed_posts)
 def recent_posts(request):
     """
     Retrieves the most recent posts.
     """
+    # Clients scrolling past the first screen pass ?cursor= / ?page_size=
+    if is_cursor_request(request):
+        page, next_cursor = keyset_page(Post.objects.select_related('design', 'user'), request)
+        serializer = PostSerializer(page, many=True, context={'request': request, 'fragment_cache': True})
+        return Response({'results': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
     # Retrieve the most recent posts, ordered by creation date (descending)
-    posts = Post.objects.all().order_by('-created_at')[:10]  # Adjust number as needed
+    posts = Post.objects.all().order_by('-created_at')[:RECENT_POSTS]
 
     # Serialize the posts
-    serializer = PostSerializer(posts, many=True, context={'request': request})
+    serializer = PostSerializer(posts, many=True, context={'request': request, 'fragment_cache': True})
 
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+def hashtag_posts(request, name):
+    """
+    Posts tagged with #name, newest first, keyset-paginated with ?cursor= / ?page_size=.
+    """
+    hashtag = Hashtag.get_by_name(name)
+    if hashtag is None:
+        return Response({'error': 'Hashtag not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    # Walks the (hashtag, post_created_at, post) index; no join until the page is known
+    links = PostHashtag.objects.filter(hashtag=hashtag).select_related('post__user', 'post__design')
+    page, next_cursor = keyset_page(links, request, field='post_created_at', pk_field='post_id')
+
+    posts = [link.post for link in page]
+    serializer = PostSerializer(posts, many=True, context={'request': request, 'fragment_cache': True})
+    return Response({
+        'hashtag': hashtag.name,
+        'results': serializer.data,
+        'next_cursor': next_cursor
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def suggest_view(request):
+    """
+    Search-box completions: hashtags and usernames starting with ?q=, most popular
+    first. Answered from the in-process prefix index in api/suggest.py.
+    """
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 5)), MAX_SUGGESTIONS))
+    except ValueError:
+        return Response({'error': 'Invalid limit.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(suggest(request.query_params.get('q', ''), limit), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def designs_by_colour(request):
+    """
+    Designs closest in colour to ?hex=<rrggbb> or to the palette of ?design=<id>,
+    nearest first (?page_size= results). Answered from the palette index in
+    api/palette_index.py without scanning the designs table.
+    """
+    try:
+        limit = get_page_size(request)
+    except ParseError as e:
+        return Response({'error': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+
+    hex_value = request.query_params.get('hex')
+    design_id = request.query_params.get('design')
+    if hex_value:
+        rgb = palette_index.parse_colour(hex_value)
+        if rgb is None:
+            return Response({'error': 'Invalid colour.'}, status=status.HTTP_400_BAD_REQUEST)
+        matches = palette_index.nearest_to_colour(rgb, limit)
+    elif design_id:
+        design = Design.objects.filter(pk=design_id).only('id', 'color1', 'color2', 'color3').first()
+        if design is None:
+            return Response({'error': 'Design not found'}, status=status.HTTP_404_NOT_FOUND)
+        palette = palette_index.design_palette(design)
+        if palette is None:
+            return Response({'error': 'Design has no colours yet.'}, status=status.HTTP_400_BAD_REQUEST)
+        matches = palette_index.nearest_to_palette(palette, limit, exclude=design.id)
+    else:
+        return Response({'error': 'Provide hex or design.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    found = Design.objects.in_bulk([match_id for match_id, distance in matches])
+    designs = [found[match_id] for match_id, distance in matches if match_id in found]
+    distances = dict(matches)
+    data = DesignSerializer(designs, many=True, context={'request': request}).data
+    # ?fields= may leave out the id
+    for design, item in zip(designs, data):
+        item['colour_distance'] = round(distances[design.id], 2)
+    return Response({'results': data}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def design_facets(request):
+    """
+    Filter counts for the shop browse UI: designs per theclass, modell, type and
+    stock state, narrowed by ?q= and by any of those facets given as params.
+    """
+    filters = facets.parse_filters(request.query_params)
+    return Response(facets.get_facets(filters, request.query_params.get('q', '')), status=status.HTTP_200_OK)
+
+
+RELATED_DESIGNS_COUNT = 8
+
+
+def related_designs_data(design_id, limit, context):
+    """Serialized designs that look most like ``design_id``, most similar first."""
+    matches = design_embeddings.similar_designs([design_id], k=limit)[design_id]
+    found = Design.objects.in_bulk([match_id for match_id, score in matches])
+    designs = [found[match_id] for match_id, score in matches if match_id in found]
+    scores = dict(matches)
+    data = DesignSerializer(designs, many=True, context=context).data
+    # ?fields= may leave out the id
+    for design, item in zip(designs, data):
+        item['similarity'] = round(scores[design.id], 4)
+    return data
+
+
+@api_view(['GET'])
+def similar_designs(request, design_id):
+    """"More like this": designs visually closest to design_id (?page_size= results)."""
+    if not Design.objects.filter(pk=design_id).exists():
+        return Response({'error': 'Design not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        limit = get_page_size(request)
+    except ParseError as e:
+        return Response({'error': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': related_designs_data(design_id, limit, {'request': request})}, status=status.HTTP_200_OK)
+
+
 from rest_framework.exceptions import NotFound
 @api_view(['GET'])
 def get_post_by_id(request, id):
     try:
         post = Post.objects.select_related('user', 'design').get(id=id)
-        
+        PostCounterShard.fold_pending([post])
+
         # Get user's other posts
         user_posts = Post.objects.filter(user=post.user).exclude(id=id).order_by('-created_at')[:5]
         
@@ -1588,10 +1794,15 @@ def get_post_by_id(request, id):
         # Use the updated PostSerializer which now includes user_details and comments
         post_data = PostSerializer(post, context=context).data
         user_posts_data = PostSerializer(user_posts, many=True, context=context).data
+        # ?fields= / ?exclude= / ?include= name post fields, not design fields
+        related = related_designs_data(
+            post.design_id, RELATED_DESIGNS_COUNT, {'request': request, 'fields': None, 'exclude': None, 'include': None}
+        )
         
         return Response({
             **post_data,
-            'user_posts': user_posts_data
+            'user_posts': user_posts_data,
+            'related_designs': related
         })
     except Post.DoesNotExist:
         return Response({'error': 'Post not found'}, status=404)
@@ -1843,6 +2054,7 @@ def update_report_status(request, report_id):
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@versioned_etag('announcements')
 def announcements_view(request):
     if request.method == 'GET':
         announcements = Announcement.objects.all()
@@ -1946,6 +2158,7 @@ def update_announcement_position(request, announcement_id):
                 position__lt=old_position
             ).update(position=models.F('position') + 1)
         
+        # save() below bumps the announcements version for the bulk update too
         announcement.position = new_position
         announcement.save()
         
@@ -2066,23 +2279,17 @@ def admin_analytics(request):
         print(f"Found {posts.count()} posts")
         
         post_stats = {
-            'top_liked': list(posts.annotate(
-                like_count=Count('likes')
-            ).filter(like_count__gt=0).order_by('-like_count').select_related('design', 'user').values(
+            'top_liked': list(posts.filter(like_count__gt=0).order_by('-like_count').select_related('design', 'user').values(
                 'id', 'caption', 'like_count', 'description', 'created_at',
                 'design__image_url', 'design__modell', 'design__type', 'design__price',
                 'user__username','user__profile_pic'
             )[:15]), 
-            'top_commented': list(posts.annotate(
-                comment_count=Count('comments')
-            ).filter(comment_count__gt=0).order_by('-comment_count').select_related('design').values(
+            'top_commented': list(posts.filter(comment_count__gt=0).order_by('-comment_count').select_related('design').values(
                 'id', 'caption', 'comment_count', 'description', 'created_at',
                 'design__image_url', 'design__modell', 'design__type', 'design__price',
                 'user__username', 'user__profile_pic'
             )[:15]),
-            'top_favorited': list(posts.annotate(
-                favorite_count=Count('favorites')
-            ).filter(favorite_count__gt=0).order_by('-favorite_count').select_related('design').values(
+            'top_favorited': list(posts.filter(favorite_count__gt=0).order_by('-favorite_count').select_related('design').values(
                 'id', 'caption', 'favorite_count', 'description', 'created_at',
                 'design__image_url', 'design__modell', 'design__type', 'design__price',
                 'user__username','user__profile_pic'
@@ -2266,7 +2473,9 @@ def add_comment(request, post_id):
         return Response({"error": "Content is required."}, status=status.HTTP_400_BAD_REQUEST)
 
     # Create the comment
-    comment = Comment.objects.create(user=request.user, post=post, content=content)
+    with transaction.atomic():
+        comment = Comment.objects.create(user=request.user, post=post, content=content)
+        post.adjust_counter('comment_count', 1)
 
     # Create a notification for the post owner when a comment is added
     notification_message = f"{request.user.username} commented on your design: {content}"
@@ -2282,6 +2491,7 @@ def add_comment(request, post_id):
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@versioned_etag('phone_products')
 def phone_products(request):
 
     
@@ -2336,6 +2546,11 @@ def phone_product_detail(request, product_id):
             stock=product.stock,
             price=product.price
         )
+        # Posts embed the design's stock and price; retire their cached fragments
+        Post.objects.filter(design__modell=product.modell, design__type=product.type).update(
+            cache_version=F('cache_version') + 1
+        )
+        ContentVersion.bump('posts', 'designs')  # stock facet counts change too
         return Response(serializer.data)
         return Response(serializer.errors, status=400)
     
@@ -2462,10 +2677,6 @@ def get_all_posts(request):
         posts = Post.objects.select_related(
             'user',
             'design'
-        ).prefetch_related(
-            'likes',
-            'comments',
-            'favorites'
         ).order_by('-created_at')
 
         # Serialize the posts
@@ -2485,9 +2696,9 @@ def get_all_posts(request):
                 'design__modell': post.design.modell,
                 'design__type': post.design.type,
                 'design__price': post.design.price,
-                'like_count': post.likes.count(),
-                'comment_count': post.comments.count(),
-                'favorite_count': post.favorites.count()
+                'like_count': post.like_count,
+                'comment_count': post.comment_count,
+                'favorite_count': post.favorite_count
             }
             posts_data.append(post_data)
 
@@ -2551,6 +2762,7 @@ def create_anonymous_design(request):
             design.save()
         except Exception as e:
             print(f"Error in classification: {e}")
+        design_embeddings.embed_later(design)
 
         # Return design data with a temporary identifier
         serializer = DesignSerializer(design)
@@ -2859,12 +3071,8 @@ def get_user_most_liked_posts(request, user_id):
     try:
         user = CustomUser.objects.get(id=user_id)
         
-        # Get user's posts with like count, ordered by most likes
-        posts = Post.objects.filter(user=user).annotate(
-            like_count=Count('likes', distinct=True),
-            comment_count=Count('comments', distinct=True),
-            favorite_count=Count('favorites', distinct=True)
-        ).order_by('-like_count', '-created_at')
+        # Get user's posts ordered by the stored like counter
+        posts = Post.objects.filter(user=user).select_related('design').order_by('-like_count', '-created_at')
         
         serializer = PostSerializer(posts, many=True, context={'request': request})
         return Response(serializer.data)
@@ -2877,12 +3085,8 @@ def get_user_most_commented_posts(request, user_id):
     try:
         user = CustomUser.objects.get(id=user_id)
         
-        # Get user's posts with comment count, ordered by most comments
-        posts = Post.objects.filter(user=user).annotate(
-            like_count=Count('likes', distinct=True),
-            comment_count=Count('comments', distinct=True),
-            favorite_count=Count('favorites', distinct=True)
-        ).order_by('-comment_count', '-created_at')
+        # Get user's posts ordered by the stored comment counter
+        posts = Post.objects.filter(user=user).select_related('design').order_by('-comment_count', '-created_at')
         
         serializer = PostSerializer(posts, many=True, context={'request': request})
         return Response(serializer.data)
@@ -168,6 +168,48 @@ DATABASES = {
         'PORT': os.getenv("MYSQL_PORT", "3306"),
     }
 }
+
+# Cache (serialized post fragments and other hot read paths).
+# Per-process memory by default; set REDIS_URL to share it across workers
+# (requires the redis package).
+REDIS_URL = os.getenv("REDIS_URL")
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Fan-out of pushed notifications (api/push.py) between workers. LocalBackend only
+# reaches streams held by the same process; RedisBackend reaches every worker.
+# The stream endpoint needs an ASGI server (backend.asgi), not the WSGI one.
+PUSH_BACKEND = os.getenv("PUSH_BACKEND", "api.push.RedisBackend" if REDIS_URL else "api.push.LocalBackend")
+
+# Write-behind likes/favorites: toggles only record an EngagementIntent row and
+# `manage.py flush_engagement` applies them in batches. For traffic spikes.
+ENGAGEMENT_WRITE_BEHIND = os.getenv("ENGAGEMENT_WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+
+# Leave trending and leaderboard updates of likes/favorites to `manage.py flush_engagement`
+# (api/engagement.py) instead of running them after each toggle commits.
+ENGAGEMENT_EVENTS_WORKER = os.getenv("ENGAGEMENT_EVENTS_WORKER", "").lower() in ("1", "true", "yes")
+
+from django.core.exceptions import ImproperlyConfigured
+
+# Either mode moves work into the flush_engagement process. Its notifications,
+# top-k lists and viewer versions only reach the web processes through Redis.
+if (ENGAGEMENT_WRITE_BEHIND or ENGAGEMENT_EVENTS_WORKER) and not REDIS_URL:
+    raise ImproperlyConfigured(
+        "ENGAGEMENT_WRITE_BEHIND and ENGAGEMENT_EVENTS_WORKER need REDIS_URL: "
+        "the flush_engagement worker shares its cache and pushed notifications with the web processes through it."
+    )
+
+# On-disk vector indexes (design colour palettes, image embeddings). Every worker on the host
+# memory-maps the same files, so this must be local disk.
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(BASE_DIR, 'var', 'indexes'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 